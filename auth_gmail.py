@@ -9,14 +9,10 @@ from urllib.parse import urlparse, parse_qs
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 
-SCOPES = [
-    "https://www.googleapis.com/auth/gmail.readonly",
-    "https://www.googleapis.com/auth/gmail.compose"
-]
+from core.accounts import SCOPES, TOKENS_DIR, list_accounts
 
 BASE_DIR = Path(__file__).parent
 CREDENTIALS_FILE = BASE_DIR / "credentials.json"
-TOKENS_DIR = BASE_DIR / "tokens"
 
 REDIRECT_URI = "http://localhost:8889/"
 
@@ -70,7 +66,7 @@ def authorize_account():
     print(f"Token saved to: {token_file}")
     
     # List all authorized accounts
-    accounts = [f.stem for f in TOKENS_DIR.glob("*.json")]
+    accounts = list_accounts()
     print(f"\nAll authorized accounts - {len(accounts)} total:")
     for acc in accounts:
         print(f"  - {acc}")
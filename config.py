@@ -1,20 +1,26 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
-load_dotenv()
+# Point at the file directly instead of letting find_dotenv() walk up directories
+load_dotenv(Path(__file__).parent / ".env")
 
 # Ollama settings
 OLLAMA_BASE_URL = "http://localhost:11434"
 OLLAMA_MODEL = "qwen3-coder:30b-a3b-q4_K_M"
+# How long Ollama keeps the model (and its prompt cache) loaded between requests
+OLLAMA_KEEP_ALIVE = "30m"
 
 # Web server settings
 HOST = "0.0.0.0"
 PORT = 8888
+# Per-iteration DEBUG logging of the chat loop (prompts, responses, tool results)
+DEBUG = os.getenv("DEBUG") == "1"
 
 # Authentication settings (loaded from .env)
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-production")
 PASSWORD_HASH = os.getenv("PASSWORD_HASH", "")
-SESSION_EXPIRY = 86400  # 24 hours
+SESSION_EXPIRY = 86400  # 24 hours; also how long an idle chat connection stays open
 
 # Assistant settings
 ASSISTANT_NAME = "Smore Assistant"
@@ -23,6 +29,10 @@ ASSISTANT_NAME = "Smore Assistant"
 SUBAGENT_MAX_DEPTH = 2
 SUBAGENT_MAX_ITERATIONS = 5
 
+# Conversation history settings
+MAX_HISTORY_MESSAGES = 40  # per session, sent to the model each turn
+MAX_HISTORY_TOKENS = 8000  # estimated at ~4 characters per token
+
 SYSTEM_PROMPT = """You are Smore's personal AI assistant with access to tools and subagents.
 
 ## How to Use Tools
@@ -88,3 +98,12 @@ For COMPLEX multi-step tasks that require reasoning or coordination, delegate to
 Current memory:
 {memory}
 """
+
+# SYSTEM_PROMPT only has the {tools} and {memory} placeholders, so split it once
+# and render by concatenation instead of running str.format every time
+_PROMPT_HEAD, _rest = SYSTEM_PROMPT.split("{tools}", 1)
+_PROMPT_MID, _PROMPT_TAIL = _rest.split("{memory}", 1)
+
+def render_system_prompt(tools: str, memory: str) -> str:
+    """Equivalent to SYSTEM_PROMPT.format(tools=tools, memory=memory)."""
+    return f"{_PROMPT_HEAD}{tools}{_PROMPT_MID}{memory}{_PROMPT_TAIL}"
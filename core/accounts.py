@@ -0,0 +1,46 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+TOKENS_DIR = Path(__file__).parent.parent / "tokens"
+
+SCOPES = [
+    "https://www.googleapis.com/auth/gmail.readonly",
+    "https://www.googleapis.com/auth/gmail.compose"
+]
+
+# (dir mtime_ns, account names) - the listing only changes when token files
+# are added or removed, which bumps the directory mtime
+_cache: tuple[int, tuple[str, ...]] = (0, ())
+
+# Lowercased account name -> account name, rebuilt with the listing
+_index: dict[str, str] = {}
+
+def list_accounts() -> tuple[str, ...]:
+    """List authorized Gmail accounts (one tokens/{email}.json per account)."""
+    global _cache, _index
+    try:
+        mtime = os.stat(TOKENS_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return ()
+
+    if mtime == _cache[0]:
+        return _cache[1]
+
+    with os.scandir(TOKENS_DIR) as entries:
+        accounts = tuple(e.name[:-5] for e in entries if e.name.endswith(".json") and e.is_file())
+    _cache = (mtime, accounts)
+    _index = {}
+    for a in accounts:
+        _index.setdefault(a.lower(), a)
+    return accounts
+
+def find_account(name: str) -> Optional[str]:
+    """Resolve a (possibly partial) account name, case-insensitively."""
+    list_accounts()
+    name_lower = name.lower()
+    # Exact match is the common case (the full address was given)
+    account = _index.get(name_lower)
+    if account is not None:
+        return account
+    return next((a for lower, a in _index.items() if name_lower in lower), None)
@@ -4,55 +4,93 @@ from pathlib import Path
 
 MEMORY_FILE = Path(__file__).parent.parent / "memory.md"
 
+_MEM_RE = re.compile(r"\[MEMORY_UPDATE\](.*?)\[/MEMORY_UPDATE\]", re.DOTALL)
+
+def memory_mtime() -> int:
+    """Modification time of the memory file in ns (0 if it doesn't exist)."""
+    try:
+        return os.stat(MEMORY_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+# (mtime_ns, content) of the last read, so unchanged files aren't re-read
+_MEM_CACHE: tuple[int, str] | None = None
+
 def read_memory() -> str:
     """Read the current memory file."""
-    if MEMORY_FILE.exists():
-        return MEMORY_FILE.read_text()
-    return ""
+    global _MEM_CACHE
+    mtime = memory_mtime()
+    if not mtime:
+        return ""
+    if _MEM_CACHE and _MEM_CACHE[0] == mtime:
+        return _MEM_CACHE[1]
+    content = MEMORY_FILE.read_bytes().decode("utf-8")
+    _MEM_CACHE = (mtime, content)
+    return content
 
 def update_memory(new_content: str) -> bool:
     """Replace memory file with new content. Keep it small!"""
-    # Limit size to prevent bloat (max ~2KB)
+    global _MEM_CACHE
+    # Limit size to prevent bloat (max ~2KB on disk). Every character is at
+    # least one byte, so an oversized block is rejected before encoding it
     if len(new_content) > 2000:
         return False
-    MEMORY_FILE.write_text(new_content)
+    data = new_content.encode("utf-8")
+    if len(data) > 2000:
+        return False
+    # The model often re-emits the same block - don't rewrite an identical file
+    if read_memory() == new_content:
+        return True
+    MEMORY_FILE.write_bytes(data)
+    _MEM_CACHE = (memory_mtime(), new_content)
     return True
 
 def append_to_section(section: str, note: str) -> bool:
     """Add a note to a specific section. Keeps things organized."""
     content = read_memory()
 
-    # Find the section and append
+    # Find the section header line (surrounding whitespace is tolerated)
     section_header = f"## {section}"
-    if section_header in content:
-        lines = content.split("\n")
-        new_lines = []
-        found_section = False
-        added = False
-
-        for i, line in enumerate(lines):
-            new_lines.append(line)
-            if line.strip() == section_header:
-                found_section = True
-            elif found_section and not added:
-                # Add after first line of section (which is usually a placeholder)
-                if line.startswith("- ") or line.startswith("##") or line == "":
-                    new_lines.insert(-1, f"- {note}")
-                    added = True
-                    found_section = False
-
-        if added:
-            return update_memory("\n".join(new_lines))
-
-    return False
+    start = content.find(section_header)
+    while True:
+        if start == -1:
+            return False
+        line_start = content.rfind("\n", 0, start) + 1
+        pos = content.find("\n", start) + 1
+        if pos == 0:
+            # Header is the last line, with nothing after it to insert before
+            return False
+        if content[line_start:pos - 1].strip() == section_header:
+            break
+        start = content.find(section_header, pos)
+
+    # Insert before the first bullet, header or blank line of the section
+    # (the first line is usually a placeholder). Content ending in "\n" has
+    # an empty last line, so the note goes at the end
+    while True:
+        line_end = content.find("\n", pos)
+        if line_end == -1:
+            line_end = len(content)
+        line = content[pos:line_end]
+        if (line.startswith("- ") or line.startswith("##") or line == "") and line.strip() != section_header:
+            return update_memory(f"{content[:pos]}- {note}\n{content[pos:]}")
+        if line_end == len(content):
+            return False
+        pos = line_end + 1
 
 def process_memory_update(response: str) -> str:
     """Process and extract memory updates from AI response."""
-    pattern = r"\[MEMORY_UPDATE\](.*?)\[/MEMORY_UPDATE\]"
-    match = re.search(pattern, response, re.DOTALL)
-    if match:
-        new_content = match.group(1).strip()
+    start = response.find("[MEMORY_UPDATE]")
+    if start == -1:
+        return response
+
+    end = response.find("[/MEMORY_UPDATE]", start + 15)
+    if end != -1:
+        new_content = response[start + 15:end].strip()
         update_memory(new_content)
         # Remove the memory update tag from response
-        return re.sub(pattern, "", response, flags=re.DOTALL).strip()
+        rest = response[:start] + response[end + 16:]
+        if "[MEMORY_UPDATE]" in rest:
+            rest = _MEM_RE.sub("", rest)
+        return rest.strip()
     return response
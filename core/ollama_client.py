@@ -1,49 +1,171 @@
+import asyncio
 import httpx
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 import config
 
+import orjson
+
+_CONTENT_KEY = b'"content":"'
+
+def _extract_content(line: bytes) -> Optional[str]:
+    """
+    Pull message.content out of a stream line without parsing the whole object.
+    Returns None if the fast scan can't find it (caller falls back to a full parse).
+    """
+    start = line.find(_CONTENT_KEY)
+    if start == -1:
+        return None
+    start += len(_CONTENT_KEY)
+
+    # Find the closing quote, skipping escaped ones
+    end = line.find(b'"', start)
+    while end != -1:
+        backslashes = 0
+        i = end - 1
+        while i >= start and line[i] == 0x5C:
+            backslashes += 1
+            i -= 1
+        if backslashes % 2 == 0:
+            break
+        end = line.find(b'"', end + 1)
+    if end == -1:
+        return None
+
+    raw = line[start:end]
+    if b"\\" not in raw:
+        return raw.decode("utf-8")
+    return orjson.loads(b'"' + raw + b'"')
+
+def _parse_line(line: bytes) -> Optional[str]:
+    """Get the content chunk from one NDJSON line, or None if it has none."""
+    content = _extract_content(line)
+    if content is not None:
+        return content
+    data = orjson.loads(line)
+    if "message" in data and "content" in data["message"]:
+        return data["message"]["content"]
+    return None
+
 class OllamaClient:
     def __init__(self, base_url: str = None, model: str = None):
         self.base_url = base_url or config.OLLAMA_BASE_URL
         self.model = model or config.OLLAMA_MODEL
-        
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Lazily create one pooled client so keep-alive connections are reused."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(120.0),
+                limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60)
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close the pooled HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
     async def chat(self, messages: list[dict], stream: bool = True) -> AsyncGenerator[str, None]:
         """Send a chat request to Ollama and stream the response."""
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "stream": stream
-            }
-            
-            if stream:
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/api/chat",
-                    json=payload
-                ) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if line:
-                            import json
-                            data = json.loads(line)
-                            if "message" in data and "content" in data["message"]:
-                                yield data["message"]["content"]
-            else:
-                response = await client.post(
-                    f"{self.base_url}/api/chat",
-                    json=payload
-                )
+        client = await self._get_client()
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": config.OLLAMA_KEEP_ALIVE
+        }
+
+        if stream:
+            async with client.stream(
+                "POST",
+                f"{self.base_url}/api/chat",
+                json=payload
+            ) as response:
                 response.raise_for_status()
-                data = response.json()
-                yield data["message"]["content"]
-    
+                # Split NDJSON ourselves so lines are parsed straight from bytes
+                pending = b""
+                async for raw in response.aiter_bytes():
+                    lines = (pending + raw).split(b"\n")
+                    pending = lines.pop()
+                    for line in lines:
+                        if line.strip():
+                            content = _parse_line(line)
+                            if content is not None:
+                                yield content
+                if pending.strip():
+                    content = _parse_line(pending)
+                    if content is not None:
+                        yield content
+        else:
+            response = await client.post(
+                f"{self.base_url}/api/chat",
+                json=payload
+            )
+            response.raise_for_status()
+            data = response.json()
+            yield data["message"]["content"]
+
+    async def chat_coalesced(self, messages: list[dict], min_interval: float = 0.015,
+                             max_chars: int = 256) -> AsyncGenerator[str, None]:
+        """
+        Stream like chat(), but merge tokens that arrive within min_interval
+        seconds (or until max_chars) so consumers send fewer, larger frames.
+        """
+        loop = asyncio.get_running_loop()
+        parts = []
+        size = 0
+        last_flush = loop.time()
+
+        stream = self.chat(messages, stream=True)
+        # The next chunk is read in a task so buffered parts can be flushed on
+        # time even while the model stalls, not only when another token arrives
+        pending = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(stream.__anext__())
+                if parts:
+                    timeout = last_flush + min_interval - loop.time()
+                    done, _ = await asyncio.wait((pending,), timeout=max(timeout, 0))
+                    if not done:
+                        yield "".join(parts)
+                        parts.clear()
+                        size = 0
+                        last_flush = loop.time()
+                        continue
+                try:
+                    chunk = await pending
+                except StopAsyncIteration:
+                    pending = None
+                    break
+                pending = None
+                parts.append(chunk)
+                size += len(chunk)
+                now = loop.time()
+                if size >= max_chars or now - last_flush >= min_interval:
+                    yield "".join(parts)
+                    parts.clear()
+                    size = 0
+                    last_flush = now
+            if parts:
+                yield "".join(parts)
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+                try:
+                    await pending
+                except (asyncio.CancelledError, StopAsyncIteration):
+                    pass
+            await stream.aclose()
+
     async def chat_simple(self, user_message: str, system_prompt: str = None) -> AsyncGenerator[str, None]:
         """Simple chat with just a user message."""
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": user_message})
-        
+
         async for chunk in self.chat(messages):
             yield chunk
@@ -0,0 +1,145 @@
+"""
+Background refresh of Gmail OAuth tokens.
+
+Credentials are kept in-process and shared with the Gmail services built from
+them, so refreshing one here is picked up by the next API call without it
+having to do the refresh round-trip itself.
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timezone
+from typing import Optional, TYPE_CHECKING
+
+from core.accounts import SCOPES, TOKENS_DIR, list_accounts
+
+import orjson
+
+# google-auth is imported on first use so that starting the app (and the
+# refresher) with no authorized accounts doesn't pay for loading it
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+# Refresh tokens this long before they actually expire. google-auth already
+# treats a token as invalid within REFRESH_THRESHOLD (3m45s) of expiry, so
+# this must be well above that for the STALE window to exist
+REFRESH_MARGIN = 600  # 10 minutes
+CHECK_INTERVAL = 60
+
+FRESH = "fresh"      # valid for longer than REFRESH_MARGIN
+STALE = "stale"      # still valid, but due for a refresh
+EXPIRED = "expired"  # unusable until refreshed (expired or inside google-auth's margin)
+
+# account -> (token file mtime_ns, Credentials); reloaded if the file changes
+# underneath us, e.g. when auth_gmail.py re-authorizes the account
+_credentials: dict[str, tuple[int, "Credentials"]] = {}
+_refreshing: dict[str, asyncio.Task] = {}
+_task: Optional[asyncio.Task] = None
+
+def load_credentials(account: str) -> Optional["Credentials"]:
+    """Get the shared Credentials for an account, parsing the token file only when it changed."""
+    token_file = TOKENS_DIR / f"{account}.json"
+    try:
+        mtime = os.stat(token_file).st_mtime_ns
+    except FileNotFoundError:
+        _credentials.pop(account, None)
+        return None
+
+    cached = _credentials.get(account)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    from google.oauth2.credentials import Credentials
+    creds = Credentials.from_authorized_user_info(orjson.loads(token_file.read_bytes()), SCOPES)
+    _credentials[account] = (mtime, creds)
+    return creds
+
+def save_credentials(account: str, creds: "Credentials"):
+    """Write refreshed credentials back to the token file."""
+    token_file = TOKENS_DIR / f"{account}.json"
+    # Write a private temp file and rename it over the token file, so
+    # auth_gmail.py or another reader never sees a half-written one
+    fd, tmp_path = tempfile.mkstemp(dir=TOKENS_DIR, prefix=f".{account}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(creds.to_json())
+        os.replace(tmp_path, token_file)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    # Our own write shouldn't make the next load re-parse the file
+    _credentials[account] = (os.stat(token_file).st_mtime_ns, creds)
+
+def token_state(creds: "Credentials") -> str:
+    """Classify credentials as FRESH, STALE or EXPIRED."""
+    # Not valid by google-auth's own clock skew margin means API calls
+    # would be refused, so the caller has to wait for the refresh
+    if not creds.valid:
+        return EXPIRED
+    if creds.expiry is None:
+        return FRESH
+    # google-auth stores expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    remaining = (creds.expiry - now).total_seconds()
+    if remaining < REFRESH_MARGIN:
+        return STALE
+    return FRESH
+
+async def _refresh(account: str, creds: "Credentials"):
+    from google.auth.transport.requests import Request
+    # google-auth refresh is a blocking HTTP call
+    await asyncio.to_thread(creds.refresh, Request())
+    await asyncio.to_thread(save_credentials, account, creds)
+
+def _spawn_refresh(account: str, creds: "Credentials") -> asyncio.Task:
+    task = _refreshing.get(account)
+    if task is None or task.done():
+        task = asyncio.create_task(_refresh(account, creds))
+        _refreshing[account] = task
+    return task
+
+async def get_fresh_credentials(account: str) -> Optional["Credentials"]:
+    """
+    Credentials that are safe to use right now.
+    STALE tokens are returned as-is while a refresh runs in the background;
+    only EXPIRED tokens make the caller wait for the refresh.
+    """
+    creds = load_credentials(account)
+    if creds is None or not creds.refresh_token:
+        return creds
+
+    state = token_state(creds)
+    if state == STALE:
+        _spawn_refresh(account, creds)
+    elif state == EXPIRED:
+        # Shielded: a cancelled caller mustn't abort the refresh other callers share
+        await asyncio.shield(_spawn_refresh(account, creds))
+    return creds
+
+async def _refresh_loop():
+    while True:
+        for account in list_accounts():
+            try:
+                creds = load_credentials(account)
+                if creds and creds.refresh_token and token_state(creds) != FRESH:
+                    await asyncio.shield(_spawn_refresh(account, creds))
+            except Exception as e:
+                print(f"Token refresh failed for {account}: {e}")
+        await asyncio.sleep(CHECK_INTERVAL)
+
+def start():
+    """Start the background refresher (call from the running event loop)."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_refresh_loop())
+
+async def stop():
+    """Cancel the background refresher."""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
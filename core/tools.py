@@ -1,26 +1,56 @@
 import re
+import time
+import asyncio
+from contextvars import ContextVar
 from typing import Optional, Tuple
 
+# Precompiled tag patterns (parsed on every model response)
+_TOOL_RE = re.compile(r"\[TOOL:([^\]]+)\](.*?)\[/TOOL\]", re.DOTALL)
+_TOOL_LENIENT_RE = re.compile(r"\[TOOL:([^\]]+)\](.*?)\[/TOO[L]?\]?", re.DOTALL)
+_TOOL_STRIP_RE = re.compile(r"\[TOOL:[^\]]+\].*?\[/TOOL\]", re.DOTALL)
+_TOOL_STRIP_LENIENT_RE = re.compile(r"\[TOOL:[^\]]+\].*?\[/TOO[L]?\]?", re.DOTALL)
+_THINK_STRIP_RE = re.compile(r"\[THINKING\].*?\[/THINKING\]", re.DOTALL)
+# Every special opening tag in one alternation; group 1 is the tag kind
+_TAG_RE = re.compile(r"\[(TOOL(?=:)|THINKING(?=\])|MEMORY_UPDATE(?=\]))")
+
 # Tool registry - tools register themselves here
 TOOLS: dict = {}
 
-# Track current recursion depth for subagents
-_current_depth = 0
+# Track current recursion depth for subagents. Context variables keep
+# concurrently running tool calls from seeing each other's values.
+_current_depth: ContextVar[int] = ContextVar("current_depth", default=0)
 
 # Track current websocket for subagent UI updates (set by web/app.py)
-_current_websocket = None
+_current_websocket: ContextVar = ContextVar("current_websocket", default=None)
+
+# Rendered tool lists keyed by depth; invalidated whenever a tool registers
+_TOOL_LIST_CACHE: dict[int, str] = {}
+_TOOL_LIST_VERSION = 0
 
 def register_tool(tool):
     """Register a tool in the global registry."""
+    global _TOOL_LIST_VERSION
     TOOLS[tool.name] = tool()
+    _TOOL_LIST_VERSION += 1
+    _TOOL_LIST_CACHE.clear()
     return tool
 
+def get_tool_list_version() -> int:
+    """Counter bumped on every registration, for callers caching derived prompts."""
+    return _TOOL_LIST_VERSION
+
 def get_tool_list() -> str:
     """Get formatted list of available tools for the system prompt."""
     return get_tool_list_filtered(depth=0)
 
 def get_tool_list_filtered(depth: int = 0) -> str:
     """Get formatted list of available tools, filtered by recursion depth."""
+    cached = _TOOL_LIST_CACHE.get(depth)
+    if cached is None:
+        cached = _TOOL_LIST_CACHE[depth] = _build_tool_list(depth)
+    return cached
+
+def _build_tool_list(depth: int) -> str:
     if not TOOLS:
         return "No tools available."
 
@@ -43,66 +73,306 @@ def get_tool_list_filtered(depth: int = 0) -> str:
 
     return "\n".join(lines) if lines else "No tools available."
 
+def scan_response(response: str) -> set[str]:
+    """
+    Find which special tags ("TOOL", "THINKING", "MEMORY_UPDATE") a response
+    contains in a single pass, so callers only run the parsers they need.
+    """
+    return {m.group(1) for m in _TAG_RE.finditer(response)}
+
+def _find_tool_call(response: str) -> Optional[Tuple[str, str, int, int]]:
+    """Locate the first tool call. Returns (tool_name, params, start, end) or None."""
+    start = response.find("[TOOL:")
+    if start == -1:
+        return None
+
+    # Fast path: slice the first well-formed block out with plain str.find
+    name_end = response.find("]", start + 6)
+    if name_end > start + 6:
+        end = response.find("[/TOOL]", name_end + 1)
+        if end != -1:
+            return (response[start + 6:name_end].strip(), response[name_end + 1:end].strip(), start, end + 7)
+
+    # Try exact pattern first, then fall back to the lenient pattern for
+    # malformed closing tags like [/TOO], [/TOOL, etc.
+    match = _TOOL_RE.search(response) or _TOOL_LENIENT_RE.search(response)
+
+    if match:
+        return (match.group(1).strip(), match.group(2).strip(), match.start(), match.end())
+
+    return None
+
 def parse_tool_call(response: str) -> Optional[Tuple[str, str]]:
     """
     Extract tool call from response.
     Returns (tool_name, params) or None if no tool call found.
     """
-    # Try exact pattern first
-    pattern = r"\[TOOL:([^\]]+)\](.*?)\[/TOOL\]"
-    match = re.search(pattern, response, re.DOTALL)
+    found = _find_tool_call(response)
+    if found:
+        return (found[0], found[1])
+    return None
 
-    if match:
-        tool_name = match.group(1).strip()
-        params = match.group(2).strip()
-        return (tool_name, params)
+def parse_tool_calls(response: str) -> list[Tuple[str, str]]:
+    """
+    Extract every tool call from response, in order.
+    Returns a list of (tool_name, params), empty if there are none.
+    """
+    if "[TOOL:" not in response:
+        return []
 
-    # Fallback: lenient pattern for malformed closing tags like [/TOO], [/TOOL, etc.
-    lenient_pattern = r"\[TOOL:([^\]]+)\](.*?)\[/TOO[L]?\]?"
-    match = re.search(lenient_pattern, response, re.DOTALL)
+    calls = [(m.group(1).strip(), m.group(2).strip()) for m in _TOOL_RE.finditer(response)]
+    if calls:
+        return calls
 
-    if match:
-        tool_name = match.group(1).strip()
-        params = match.group(2).strip()
-        return (tool_name, params)
+    # Malformed closing tag - fall back to the lenient single-call parse
+    call = parse_tool_call(response)
+    return [call] if call else []
 
-    return None
+def split_tool_calls(response: str) -> Tuple[str, list[Tuple[str, str]]]:
+    """
+    parse_tool_calls() plus the text ahead of the first call, in one scan.
+    Returns (text_before, [(tool_name, params), ...]); text_before is the
+    whole stripped response when there are no calls.
+    """
+    if "[TOOL:" not in response:
+        return response.strip(), []
+
+    calls = []
+    first_start = -1
+    for m in _TOOL_RE.finditer(response):
+        if first_start == -1:
+            first_start = m.start()
+        calls.append((m.group(1).strip(), m.group(2).strip()))
+    if calls:
+        return response[:first_start].strip(), calls
+
+    # Malformed closing tag - fall back to the lenient single-call parse
+    found = _find_tool_call(response)
+    if found:
+        return response[:found[2]].strip(), [(found[0], found[1])]
+    return response.strip(), []
 
 def strip_tool_call(response: str) -> str:
     """Remove tool call block from response."""
+    if "[TOOL:" not in response:
+        return response.strip()
+
     # Try exact pattern first
-    pattern = r"\[TOOL:[^\]]+\].*?\[/TOOL\]"
-    result = re.sub(pattern, "", response, flags=re.DOTALL).strip()
+    result = _TOOL_STRIP_RE.sub("", response).strip()
 
     if result != response.strip():
         return result
 
     # Fallback for malformed closing tags
-    lenient_pattern = r"\[TOOL:[^\]]+\].*?\[/TOO[L]?\]?"
-    return re.sub(lenient_pattern, "", response, flags=re.DOTALL).strip()
+    return _TOOL_STRIP_LENIENT_RE.sub("", response).strip()
 
 def parse_thinking(response: str) -> Optional[str]:
     """
     Extract thinking content from response.
     Returns thinking content or None if no thinking tags found.
     """
-    pattern = r"\[THINKING\](.*?)\[/THINKING\]"
-    match = re.search(pattern, response, re.DOTALL)
+    start = response.find("[THINKING]")
+    if start == -1:
+        return None
 
-    if match:
-        return match.group(1).strip()
+    end = response.find("[/THINKING]", start + 10)
+    if end == -1:
+        return None
 
-    return None
+    return response[start + 10:end].strip()
+
+def take_thinking(response: str) -> Tuple[Optional[str], str]:
+    """
+    Extract thinking content and remove thinking blocks in one scan.
+    Returns (thinking or None, remaining text).
+    """
+    start = response.find("[THINKING]")
+    if start == -1:
+        return None, response.strip()
+
+    end = response.find("[/THINKING]", start + 10)
+    if end == -1:
+        return None, strip_thinking(response)
+
+    thinking = response[start + 10:end].strip()
+    rest = response[:start] + response[end + 11:]
+    if "[THINKING]" in rest:
+        rest = strip_thinking(rest)
+    return thinking, rest.strip()
 
 def strip_thinking(response: str) -> str:
     """Remove thinking tags from response."""
-    pattern = r"\[THINKING\].*?\[/THINKING\]"
-    return re.sub(pattern, "", response, flags=re.DOTALL).strip()
+    if "[THINKING]" not in response:
+        return response.strip()
+    return _THINK_STRIP_RE.sub("", response).strip()
+
+class ToolCallStreamParser:
+    """
+    Incrementally detect [TOOL:name]params[/TOOL] blocks while a response is
+    still streaming. Each chunk is scanned once; text inside
+    [THINKING]...[/THINKING] and [MEMORY_UPDATE]...[/MEMORY_UPDATE] is skipped,
+    so tags quoted there aren't taken for calls.
+    """
+
+    SCANNING, IN_THINKING, IN_NAME, IN_PARAMS, IN_MEMORY = range(5)
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._state = self.SCANNING
+        self._name = ""
+        self.calls: list[Tuple[str, str]] = []
+        self.done = False
+        # Once done: where the text after the tool calls starts in the last
+        # chunk fed (0 if it started in an earlier, held-back chunk)
+        self.cut: Optional[int] = None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consume a chunk. Returns True once the model has finished its run of
+        tool calls (anything other than another tool call or a memory update
+        follows the last one), meaning generation can stop.
+        """
+        if self.done:
+            return True
+
+        buf = self._buf + chunk
+        state = self._state
+
+        while True:
+            if state == self.SCANNING and self.calls:
+                # After a tool call only another tool call (or a memory
+                # update, which is handled once the response is complete) may follow
+                rest = buf.lstrip()
+                if rest.startswith("[TOOL:"):
+                    buf = rest[6:]
+                    state = self.IN_NAME
+                elif rest.startswith("[MEMORY_UPDATE]"):
+                    buf = rest[15:]
+                    state = self.IN_MEMORY
+                elif not rest or "[TOOL:".startswith(rest) or "[MEMORY_UPDATE]".startswith(rest):
+                    buf = rest
+                    break
+                else:
+                    self.done = True
+                    # rest is a suffix of everything fed so far
+                    self.cut = max(0, len(chunk) - len(rest))
+                    break
+            elif state == self.SCANNING:
+                match = _TAG_RE.search(buf)
+                if match is None:
+                    # Keep just enough to match an opening tag split across
+                    # chunks ("[MEMORY_UPDATE" is the longest)
+                    buf = buf[-14:]
+                    break
+                kind = match.group(1)
+                # Skip past the tag's "]" or ":"
+                buf = buf[match.end() + 1:]
+                if kind == "TOOL":
+                    state = self.IN_NAME
+                elif kind == "THINKING":
+                    state = self.IN_THINKING
+                else:
+                    state = self.IN_MEMORY
+            elif state == self.IN_THINKING:
+                end = buf.find("[/THINKING]")
+                if end == -1:
+                    buf = buf[-10:]
+                    break
+                buf = buf[end + 11:]
+                state = self.SCANNING
+            elif state == self.IN_MEMORY:
+                end = buf.find("[/MEMORY_UPDATE]")
+                if end == -1:
+                    buf = buf[-15:]
+                    break
+                buf = buf[end + 16:]
+                state = self.SCANNING
+            elif state == self.IN_NAME:
+                end = buf.find("]")
+                if end == -1:
+                    break
+                if end == 0:
+                    # Empty tool name - not a tool call, keep scanning
+                    state = self.SCANNING
+                    continue
+                self._name = buf[:end].strip()
+                buf = buf[end + 1:]
+                self._pos = 0
+                state = self.IN_PARAMS
+            else:
+                end = buf.find("[/TOOL]", self._pos)
+                if end == -1:
+                    # Only rescan the tail that could hold a split closing tag
+                    self._pos = max(0, len(buf) - 6)
+                    break
+                self.calls.append((self._name, buf[:end].strip()))
+                buf = buf[end + 7:]
+                state = self.SCANNING
+
+        self._buf = buf
+        self._state = state
+        return self.done
+
+class StreamDisplayFilter:
+    """
+    Remove [THINKING]...[/THINKING] and [TOOL:...]...[/TOOL] spans from streamed
+    text before it is shown. Works however the chunks split the tags: a
+    trailing partial opening tag is held back until the next chunk decides it.
+    """
+
+    _TAGS = (("[THINKING]", "[/THINKING]"), ("[TOOL:", "[/TOOL]"))
+
+    def __init__(self):
+        self._buf = ""
+        self._close: Optional[str] = None
+
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk and return the part of it that is safe to display."""
+        buf = self._buf + chunk
+        out = []
+
+        while buf:
+            if self._close:
+                end = buf.find(self._close)
+                if end == -1:
+                    # Keep enough to match a closing tag split across chunks
+                    buf = buf[-(len(self._close) - 1):]
+                    break
+                buf = buf[end + len(self._close):]
+                self._close = None
+                continue
+
+            start = buf.find("[")
+            if start == -1:
+                out.append(buf)
+                buf = ""
+                break
+            out.append(buf[:start])
+            buf = buf[start:]
+
+            for open_tag, close_tag in self._TAGS:
+                if buf.startswith(open_tag):
+                    buf = buf[len(open_tag):]
+                    self._close = close_tag
+                    break
+            else:
+                if any(open_tag.startswith(buf) for open_tag, _ in self._TAGS):
+                    # Could still turn into a tag - wait for more text
+                    break
+                out.append("[")
+                buf = buf[1:]
+
+        self._buf = buf
+        return "".join(out)
+
+    def flush(self) -> str:
+        """Return held-back text once the stream has ended."""
+        buf, self._buf = self._buf, ""
+        return "" if self._close else buf
 
 async def execute_tool(name: str, params: str, depth: int = 0, websocket=None) -> str:
     """Execute a tool by name with given params at specified depth."""
-    global _current_depth, _current_websocket
-
     if name not in TOOLS:
         return f"Error: Unknown tool. Available: {', '.join(TOOLS.keys())}"
 
@@ -114,11 +384,8 @@ async def execute_tool(name: str, params: str, depth: int = 0, websocket=None) -
         return "Error: Maximum subagent nesting depth exceeded"
 
     # Set current depth and websocket for subagents to access
-    old_depth = _current_depth
-    old_websocket = _current_websocket
-    _current_depth = depth
-    if websocket is not None:
-        _current_websocket = websocket
+    depth_token = _current_depth.set(depth)
+    websocket_token = _current_websocket.set(websocket) if websocket is not None else None
 
     try:
         result = await TOOLS[name].run(params)
@@ -126,5 +393,25 @@ async def execute_tool(name: str, params: str, depth: int = 0, websocket=None) -
     except Exception as e:
         return f"Error running {name}: {str(e)}"
     finally:
-        _current_depth = old_depth
-        _current_websocket = old_websocket
+        _current_depth.reset(depth_token)
+        if websocket_token is not None:
+            _current_websocket.reset(websocket_token)
+
+async def _execute_tool_timed(name: str, params: str, depth: int, websocket) -> Tuple[str, int]:
+    start_ns = time.monotonic_ns()
+    result = await execute_tool(name, params, depth, websocket)
+    return result, (time.monotonic_ns() - start_ns) // 1_000_000
+
+async def execute_tools_parallel(calls: list[Tuple[str, str]], depth: int = 0, websocket=None) -> list[Tuple[str, int]]:
+    """
+    Execute independent tool calls concurrently. Returns (result, duration in ms)
+    for each call, in the order of calls.
+    """
+    results = await asyncio.gather(
+        *(_execute_tool_timed(name, params, depth, websocket) for name, params in calls),
+        return_exceptions=True
+    )
+    return [
+        (f"Error running {name}: {str(result)}", 0) if isinstance(result, BaseException) else result
+        for (name, _), result in zip(calls, results)
+    ]
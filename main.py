@@ -14,13 +14,20 @@ sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
 
 if __name__ == "__main__":
+    # Auto-reload (file watcher + supervisor process) only when DEV=1
+    dev = os.getenv("DEV") == "1"
+
     print(f"Starting {config.ASSISTANT_NAME}...")
     print(f"Web UI: http://localhost:{config.PORT}")
     print(f"Using Ollama model: {config.OLLAMA_MODEL}")
+    if dev:
+        print("Dev mode: auto-reload enabled")
 
+    # uvicorn[standard] picks uvloop + httptools automatically when installed
     uvicorn.run(
         "web.app:app",
         host=config.HOST,
         port=config.PORT,
-        reload=True  # Auto-reload on code changes during development
+        reload=dev,
+        access_log=dev
     )
@@ -23,3 +23,7 @@ class Tool(ABC):
     def get_help(self) -> str:
         """Return help text for this tool."""
         return f"{self.name}: {self.description}"
+
+    async def aclose(self):
+        """Release resources held by the tool (called on app shutdown)."""
+        pass
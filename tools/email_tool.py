@@ -1,35 +1,138 @@
-import os
 import re
 import base64
+import binascii
+import asyncio
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from pathlib import Path
 from tools.base import Tool
 from core.tools import register_tool
+from core.accounts import list_accounts, find_account
+from core.token_refresher import FRESH, get_fresh_credentials, token_state
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import orjson
 
-SCOPES = [
-    "https://www.googleapis.com/auth/gmail.readonly",
-    "https://www.googleapis.com/auth/gmail.compose"
-]
+# The Google client libraries are heavy to import, so they're loaded on first
+# use inside the functions below rather than when the tools register
 
 BASE_DIR = Path(__file__).parent.parent
 CREDENTIALS_FILE = BASE_DIR / "credentials.json"
-TOKENS_DIR = BASE_DIR / "tokens"
 
 _services = {}
 
-def get_authorized_accounts():
-    if not TOKENS_DIR.exists():
-        return []
-    return [f.stem for f in TOKENS_DIR.glob("*.json")]
+# Dedicated, bounded pool for Gmail API calls, so they neither churn threads
+# nor compete with other to_thread users for the default executor
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gmail")
+
+# httplib2.Http isn't thread-safe, so each worker thread gets its own. One Http
+# per thread is shared by every account, so they all reuse the same keep-alive
+# connection to Gmail; only the thin authorizing wrapper is per credentials.
+_thread_http = threading.local()
+
+# Seconds before a stalled Gmail request gives up (httplib2 default is never)
+HTTP_TIMEOUT = 20
+
+def _get_thread_http(creds):
+    local = _thread_http.__dict__
+    if "http" not in local:
+        import httplib2
+        local["http"] = httplib2.Http(timeout=HTTP_TIMEOUT)
+        local["by_creds"] = {}
+    cache = local["by_creds"]
+    http = cache.get(id(creds))
+    if http is None or http.credentials is not creds:
+        import google_auth_httplib2
+        http = cache[id(creds)] = google_auth_httplib2.AuthorizedHttp(creds, http=local["http"])
+    return http
+
+async def gmail_execute(request):
+    """Run a googleapiclient request in a worker thread so it doesn't block the event loop."""
+    creds = request.http.credentials
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR, lambda: request.execute(http=_get_thread_http(creds)))
+
+async def gmail_execute_batch(service, requests):
+    """
+    Send several requests as one batch HTTP call.
+    Returns a response (or the exception it raised) per request, in order.
+    Requests that fail inside the batch (Gmail often rate-limits individual
+    parts) are retried individually and concurrently.
+    """
+    results = [None] * len(requests)
+
+    def callback(request_id, response, exception):
+        results[int(request_id)] = exception if exception is not None else response
+
+    batch = service.new_batch_http_request(callback=callback)
+    for i, request in enumerate(requests):
+        batch.add(request, request_id=str(i))
+
+    creds = requests[0].http.credentials
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_EXECUTOR, lambda: batch.execute(http=_get_thread_http(creds)))
+    except Exception as e:
+        # The batch request itself failed - every part gets retried below
+        results = [e] * len(requests)
+
+    failed = [i for i, result in enumerate(results) if result is None or isinstance(result, Exception)]
+    if failed:
+        retried = await asyncio.gather(*(gmail_execute(requests[i]) for i in failed), return_exceptions=True)
+        for i, result in zip(failed, retried):
+            results[i] = result
+    return results
 
-def get_gmail_service(account=None):
+def get_authorized_accounts():
+    return list_accounts()
+
+# Requested account string (or None for the default) -> resolved account
+_resolved = {}
+
+# Parsed Gmail discovery document and response model, shared by every account's service
+_discovery_doc = None
+_response_model = None
+
+def _make_response_model(data_wrapper):
+    """A googleapiclient JsonModel that parses responses with orjson."""
+    from googleapiclient.model import JsonModel
+
+    class FastJsonModel(JsonModel):
+        def deserialize(self, content):
+            try:
+                body = orjson.loads(content)
+            except ValueError:
+                # Not JSON - let JsonModel handle it the usual way
+                return super().deserialize(content)
+            if self._data_wrapper and isinstance(body, dict) and "data" in body:
+                body = body["data"]
+            return body
+
+    return FastJsonModel(data_wrapper=data_wrapper)
+
+def _build_gmail_service(creds):
+    """Build a Gmail client from the discovery document bundled with googleapiclient."""
+    global _discovery_doc, _response_model
+    from googleapiclient.discovery import build_from_document
+    if _discovery_doc is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        # Parse once; build() would re-read and re-parse it for every account
+        _discovery_doc = orjson.loads(get_static_doc("gmail", "v1"))
+        _response_model = _make_response_model("dataWrapper" in _discovery_doc.get("features", []))
+    return build_from_document(_discovery_doc, credentials=creds, model=_response_model)
+
+async def get_gmail_service(account=None):
     global _services
     
+    # Fast path: a previously resolved account whose in-memory token isn't due
+    # for a refresh needs no filesystem checks at all
+    resolved = _resolved.get(account)
+    if resolved is not None:
+        cached = _services.get(resolved)
+        if cached and token_state(cached[0]) == FRESH:
+            return cached[1], resolved
+    
     if not CREDENTIALS_FILE.exists():
         return None, "credentials.json not found. Download from Google Cloud Console."
     
@@ -38,36 +141,67 @@ def get_gmail_service(account=None):
     if not accounts:
         return None, "No accounts authorized yet. Run: python ~/assistant/auth_gmail.py"
     
+    requested = account
     if account is None:
         account = accounts[0]
     else:
-        account_lower = account.lower()
-        matches = [a for a in accounts if account_lower in a.lower()]
-        if not matches:
+        match = find_account(account)
+        if match is None:
             return None, f"Account not found. Available: {', '.join(accounts)}"
-        account = matches[0]
-    
-    if account in _services:
-        return _services[account], account
-    
-    token_file = TOKENS_DIR / f"{account}.json"
-    creds = None
-    
-    if token_file.exists():
-        creds = Credentials.from_authorized_user_file(str(token_file), SCOPES)
+        account = match
+    _resolved[requested] = account
     
+    # Shared with the background refresher. Tokens close to expiry are
+    # refreshed in the background; only expired ones wait for the refresh
+    try:
+        creds = await get_fresh_credentials(account)
+    except Exception:
+        creds = None
     if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-            with open(token_file, "w") as f:
-                f.write(creds.to_json())
-        else:
-            return None, f"Token expired for {account}. Re-run auth_gmail.py"
+        return None, f"Token expired for {account}. Re-run auth_gmail.py"
+    
+    # Reuse the service as long as it was built from the current credentials
+    # (the token file's mtime decides whether they're current)
+    cached = _services.get(account)
+    if cached and cached[0] is creds:
+        return cached[1], account
     
-    service = build("gmail", "v1", credentials=creds)
-    _services[account] = service
+    service = _build_gmail_service(creds)
+    _services[account] = (creds, service)
     return service, account
 
+# Gmail query keywords; params starting with query syntax like
+# "from:email@domain" have no account prefix
+GMAIL_KEYWORDS = frozenset(('from', 'to', 'cc', 'bcc', 'subject', 'in', 'is', 'has', 'after', 'before'))
+
+def split_account_prefix(params):
+    """
+    Split an optional account prefix off a search query.
+    Supports both "account query" and "account:query" formats, with the
+    account at the VERY START of params.
+    Returns (account or None, query).
+    """
+    colon = params.find(":")
+    if colon != -1 and params[:colon].lower() in GMAIL_KEYWORDS:
+        return None, params
+
+    parts = params.split(None, 1)
+    if not parts:
+        return None, params
+    first_word = parts[0]
+
+    # Space-separated format: "email@domain query"
+    if colon == -1 or ":" not in first_word:
+        if "@" in first_word and len(parts) == 2:
+            return first_word, parts[1]
+        return None, params
+
+    # Colon-separated format: "email@domain:query" (email must come FIRST,
+    # with the colon inside the first word)
+    if params.startswith(first_word) and params.find("@", 0, colon) != -1:
+        return params[:colon], params[colon + 1:]
+    return None, params
+
 @register_tool
 class ListAccountsTool(Tool):
     name = "list_email_accounts"
@@ -85,41 +219,16 @@ class SearchEmailsTool(Tool):
     description = "Search emails IN a specific account. Format: 'account@email.com query' or 'account@email.com:query'. IMPORTANT: Put the account FIRST, then the Gmail search query. Examples: 'ytsmore27@gmail.com subject:GPU' searches the ytsmore27 account for emails about GPU. 'ytsmore27@gmail.com from:ebay' searches ytsmore27 account for emails FROM ebay."
 
     async def run(self, params):
-        # Parse account prefix - support both "account query" and "account:query" formats
-        # IMPORTANT: Account prefix must be at the VERY START (not Gmail query syntax like "from:email@domain")
-        account = None
-        query = params
-
-        # Check if params starts with an email address (not preceded by query keywords)
-        # Common Gmail query keywords that contain `:` before the email
-        gmail_keywords = ['from:', 'to:', 'cc:', 'bcc:', 'subject:', 'in:', 'is:', 'has:', 'after:', 'before:']
-
-        # If params starts with a Gmail keyword, treat entire params as query (no account prefix)
-        starts_with_keyword = any(params.lower().startswith(kw) for kw in gmail_keywords)
-
-        if not starts_with_keyword:
-            first_word = params.split(None, 1)[0] if params else ""
-
-            # Space-separated format: "email@domain query"
-            if "@" in first_word and ":" not in first_word:
-                parts = params.split(None, 1)
-                if len(parts) == 2:
-                    account = parts[0]
-                    query = parts[1]
-            # Colon-separated format: "email@domain:query" (email must come FIRST)
-            elif ":" in params and "@" in params:
-                colon_pos = params.index(":")
-                at_pos = params.index("@")
-                # @ must come before : AND be in the first word (before any space)
-                if at_pos < colon_pos and (":  " not in params or at_pos < params.index(" ")):
-                    account, query = params.split(":", 1)
+        account, query = split_account_prefix(params)
         
-        service, acct = get_gmail_service(account)
+        service, acct = await get_gmail_service(account)
         if service is None:
             return acct
         
         try:
-            results = service.users().messages().list(userId="me", q=query, maxResults=5).execute()
+            results = await gmail_execute(service.users().messages().list(
+                userId="me", q=query, maxResults=5, fields="messages/id"
+            ))
             messages = results.get("messages", [])
             
             if not messages:
@@ -127,11 +236,18 @@ class SearchEmailsTool(Tool):
             
             output = [f"Found {len(messages)} email(s) in {acct}:"]
             
-            for msg in messages:
-                msg_data = service.users().messages().get(
+            # Fetch all the metadata in one batched round-trip
+            msg_datas = await gmail_execute_batch(service, [
+                service.users().messages().get(
                     userId="me", id=msg["id"], format="metadata",
-                    metadataHeaders=["Subject", "From", "Date"]
-                ).execute()
+                    metadataHeaders=["Subject", "From", "Date"], fields="payload/headers"
+                )
+                for msg in messages
+            ])
+            
+            for msg_data in msg_datas:
+                if isinstance(msg_data, Exception):
+                    raise msg_data
                 
                 headers = {h["name"]: h["value"] for h in msg_data["payload"]["headers"]}
                 subject = headers.get("Subject", "(no subject)")[:50]
@@ -145,6 +261,37 @@ class SearchEmailsTool(Tool):
         except Exception as e:
             return f"Error searching: {str(e)}"
 
+# (opening, closing) patterns of blocks removed along with their content
+_SCRIPT_BLOCK = (re.compile(r'<script[^>]*>', re.IGNORECASE), re.compile(r'</script>', re.IGNORECASE))
+_STYLE_BLOCK = (re.compile(r'<style[^>]*>', re.IGNORECASE), re.compile(r'</style>', re.IGNORECASE))
+_COMMENT_BLOCK = (re.compile(r'<!--'), re.compile(r'-->'))
+_BLOCK_CLOSE_RE = re.compile(r'</(div|p|br|tr|h[1-6]|li)>', re.IGNORECASE)
+_BR_RE = re.compile(r'<br\s*/?>', re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+def _remove_blocks(text, block):
+    """
+    Remove every open...close block, like re.sub(open + '.*?' + close, '', text)
+    but linear: the first block with no closing tag ends the scan, rather than
+    every later opening tag rescanning to the end of the text.
+    """
+    open_re, close_re = block
+    out = []
+    pos = 0
+    while True:
+        start = open_re.search(text, pos)
+        if start is None:
+            break
+        end = close_re.search(text, start.end())
+        if end is None:
+            break
+        out.append(text[pos:start.start()])
+        pos = end.end()
+    if not out:
+        return text
+    out.append(text[pos:])
+    return ''.join(out)
+
 def strip_html_tags(html):
     """
     Strip HTML tags and decode entities to get plain text content.
@@ -158,18 +305,18 @@ def strip_html_tags(html):
     import html as html_module
 
     # Remove script and style elements
-    text = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL | re.IGNORECASE)
+    text = _remove_blocks(html, _SCRIPT_BLOCK)
+    text = _remove_blocks(text, _STYLE_BLOCK)
 
     # Remove HTML comments
-    text = re.sub(r'<!--.*?-->', '', text, flags=re.DOTALL)
+    text = _remove_blocks(text, _COMMENT_BLOCK)
 
     # Replace common block elements with newlines
-    text = re.sub(r'</(div|p|br|tr|h[1-6]|li)>', '\n', text, flags=re.IGNORECASE)
-    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
+    text = _BLOCK_CLOSE_RE.sub('\n', text)
+    text = _BR_RE.sub('\n', text)
 
     # Remove all remaining HTML tags
-    text = re.sub(r'<[^>]+>', '', text)
+    text = _HTML_TAG_RE.sub('', text)
 
     # Decode HTML entities
     text = html_module.unescape(text)
@@ -181,9 +328,20 @@ def strip_html_tags(html):
 
     return text
 
+_B64URL_TO_STD = bytes.maketrans(b"-_", b"+/")
+
+def decode_body_data(data):
+    """
+    Decode a Gmail base64url body part to text in one C-level pass,
+    tolerating the missing padding Gmail sometimes leaves off.
+    """
+    raw = data.encode("ascii").translate(_B64URL_TO_STD)
+    raw += b"=" * (-len(raw) % 4)
+    return binascii.a2b_base64(raw).decode("utf-8", errors="replace")
+
 def extract_body_from_payload(payload):
     """
-    Recursively extract email body from Gmail API payload.
+    Extract email body from Gmail API payload.
     Handles nested multipart structures (multipart/alternative, multipart/related, etc.)
 
     Args:
@@ -192,37 +350,40 @@ def extract_body_from_payload(payload):
     Returns:
         tuple: (plain_text_body, html_body)
     """
-    def extract_from_parts(parts, body_type):
-        """Recursively search for specific MIME type in nested parts."""
-        for part in parts:
+    plain_body = None
+    html_body = None
+
+    # Handle nested parts structure
+    if "parts" in payload:
+        # Iterative depth-first walk (same order as recursing would visit parts)
+        # that finds the first text/plain and text/html parts in one pass
+        found = {}
+        stack = list(reversed(payload["parts"]))
+        while stack:
+            part = stack.pop()
             mime_type = part.get("mimeType", "")
 
-            # Direct match - found the content!
-            if mime_type == body_type:
+            # Direct match - found the content! (attachments are never the body)
+            if mime_type in ("text/plain", "text/html") and mime_type not in found and not part.get("filename"):
                 body_data = part.get("body", {}).get("data")
                 if body_data:
-                    return base64.urlsafe_b64decode(body_data).decode("utf-8", errors="replace")
+                    found[mime_type] = body_data
+                    if len(found) == 2:
+                        break
 
-            # Nested multipart - recurse deeper
+            # Nested multipart - descend into it next
             if mime_type.startswith("multipart/") and "parts" in part:
-                result = extract_from_parts(part["parts"], body_type)
-                if result:
-                    return result
-
-        return None
+                stack.extend(reversed(part["parts"]))
 
-    plain_body = None
-    html_body = None
-
-    # Handle nested parts structure
-    if "parts" in payload:
-        plain_body = extract_from_parts(payload["parts"], "text/plain")
-        html_body = extract_from_parts(payload["parts"], "text/html")
+        if "text/plain" in found:
+            plain_body = decode_body_data(found["text/plain"])
+        if "text/html" in found:
+            html_body = decode_body_data(found["text/html"])
 
     # Handle simple single-part messages
     elif "body" in payload and "data" in payload["body"]:
         mime_type = payload.get("mimeType", "")
-        body_data = base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8", errors="replace")
+        body_data = decode_body_data(payload["body"]["data"])
 
         if mime_type == "text/plain":
             plain_body = body_data
@@ -231,6 +392,38 @@ def extract_body_from_payload(payload):
 
     return plain_body, html_body
 
+_HREF_URL_RE = re.compile(r'href=["\'](http[^"\']*)["\']')
+_TEXT_URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+
+def parse_message(msg):
+    """
+    Decode a full Gmail message.
+    Returns (subject, sender, date, readable body, html body or None).
+    """
+    headers = {h["name"]: h["value"] for h in msg["payload"]["headers"]}
+
+    subject = headers.get("Subject", "(no subject)")
+    sender = headers.get("From", "unknown")
+    date = headers.get("Date", "")
+
+    # Extract email body using recursive parser (handles nested multipart structures)
+    plain_body, html_body = extract_body_from_payload(msg["payload"])
+
+    # Prefer plain text, fall back to HTML (strip tags if HTML-only)
+    if plain_body:
+        body = plain_body
+    elif html_body:
+        # Strip HTML tags to make it readable
+        body = strip_html_tags(html_body)
+    else:
+        body = "[Email body could not be extracted]"
+
+    return subject, sender, date, body, html_body
+
+# (account, message id) -> parse_message() result, most recent last
+_message_cache = {}
+MESSAGE_CACHE_SIZE = 16
+
 @register_tool
 class ReadEmailTool(Tool):
     name = "read_email"
@@ -247,94 +440,67 @@ class ReadEmailTool(Tool):
                 offset = int(offset_str)
                 params = params[:last_pipe]
 
-        # Parse account prefix - same logic as SearchEmailsTool
-        account = None
-        query = params
-
-        # Gmail query keywords that shouldn't be confused with account prefix
-        gmail_keywords = ['from:', 'to:', 'cc:', 'bcc:', 'subject:', 'in:', 'is:', 'has:', 'after:', 'before:']
-        starts_with_keyword = any(params.lower().startswith(kw) for kw in gmail_keywords)
-
-        if not starts_with_keyword:
-            first_word = params.split(None, 1)[0] if params else ""
-
-            # Space-separated: "email@domain query"
-            if "@" in first_word and ":" not in first_word:
-                parts = params.split(None, 1)
-                if len(parts) == 2:
-                    account = parts[0]
-                    query = parts[1]
-            # Colon-separated: "email@domain:query"
-            elif ":" in params and "@" in params:
-                colon_pos = params.index(":")
-                at_pos = params.index("@")
-                if at_pos < colon_pos and (" " not in params or at_pos < params.index(" ")):
-                    account, query = params.split(":", 1)
+        account, query = split_account_prefix(params)
         
-        service, acct = get_gmail_service(account)
+        service, acct = await get_gmail_service(account)
         if service is None:
             return acct
         
         try:
-            results = service.users().messages().list(userId="me", q=query, maxResults=1).execute()
+            results = await gmail_execute(service.users().messages().list(
+                userId="me", q=query, maxResults=1, fields="messages/id"
+            ))
             messages = results.get("messages", [])
             
             if not messages:
                 return "Email not found."
             
-            msg = service.users().messages().get(userId="me", id=messages[0]["id"], format="full").execute()
-            headers = {h["name"]: h["value"] for h in msg["payload"]["headers"]}
-            
-            subject = headers.get("Subject", "(no subject)")
-            sender = headers.get("From", "unknown")
-            date = headers.get("Date", "")
-            
-            payload = msg["payload"]
-
-            # Extract email body using recursive parser (handles nested multipart structures)
-            plain_body, html_body = extract_body_from_payload(payload)
-
-            # Prefer plain text, fall back to HTML (strip tags if HTML-only)
-            if plain_body:
-                body = plain_body
-            elif html_body:
-                # Strip HTML tags to make it readable
-                body = strip_html_tags(html_body)
-            else:
-                body = "[Email body could not be extracted]"
-
-            # Extract URLs from HTML if we don't have plain text or to supplement it
+            # Message contents never change for a given id, so paging through a
+            # long email with |offset only costs the list round-trip; the
+            # decoded body is cached too, so continuations just slice it
+            msg_key = (acct, messages[0]["id"])
+            parsed = _message_cache.get(msg_key)
+            if parsed is None:
+                msg = await gmail_execute(service.users().messages().get(
+                    userId="me", id=messages[0]["id"], format="full", fields="payload"
+                ))
+                parsed = parse_message(msg)
+                if len(_message_cache) >= MESSAGE_CACHE_SIZE:
+                    # Evict the oldest entry (dicts keep insertion order)
+                    del _message_cache[next(iter(_message_cache))]
+                _message_cache[msg_key] = parsed
+            subject, sender, date, body, html_body = parsed
+
+            # Extract URLs from HTML if we don't have plain text or to supplement it.
+            # Links are only listed with the first chunk, so skip the scans otherwise
             urls = []
-            if html_body:
-                # Extract URLs from href attributes
-                url_pattern = r'href=["\']([^"\']+)["\']'
-                urls = list(set(re.findall(url_pattern, html_body)))
-                # Filter out common non-useful links (mailto, #anchors, etc.)
-                urls = [url for url in urls if url.startswith('http')]
-
-            # Also extract plain URLs from text body
-            if body:
-                text_url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+'
-                text_urls = re.findall(text_url_pattern, body)
-                urls.extend(text_urls)
-                urls = list(set(urls))  # Remove duplicates
+            if offset == 0:
+                # Insertion-ordered dict dedupes while keeping links in document order
+                found = {}
+                if html_body:
+                    # href attributes, skipping non-useful links (mailto, #anchors, etc.)
+                    found = dict.fromkeys(_HREF_URL_RE.findall(html_body))
+                # Also extract plain URLs from text body
+                if body:
+                    found.update(dict.fromkeys(_TEXT_URL_RE.findall(body)))
+                urls = list(found)
 
             # Apply offset and truncation
             total_length = len(body)
             if offset >= total_length:
                 return f"From: {sender}\nSubject: {subject}\nDate: {date}\n\nOffset {offset} exceeds email length ({total_length} chars). Email ends at char {total_length}."
 
-            body = body[offset:]
             chunk_size = 2000
 
-            if len(body) > chunk_size:
-                body = body[:chunk_size]
+            # Slice just the requested window rather than copying the whole tail
+            if total_length - offset > chunk_size:
+                body = body[offset:offset + chunk_size]
                 next_offset = offset + chunk_size
                 truncation_msg = f"... [truncated at char {next_offset} of {total_length}, use offset {next_offset} to read more]"
                 body += truncation_msg
             elif offset > 0:
                 # This is a continuation chunk that's complete
-                body = f"[Continuing from char {offset}]\n" + body
+                body = f"[Continuing from char {offset}]\n" + body[offset:]
 
             # Build response with links section
             response = f"From: {sender}\nSubject: {subject}\nDate: {date}\n\n{body}"
@@ -352,6 +518,49 @@ class ReadEmailTool(Tool):
         except Exception as e:
             return f"Error reading email: {str(e)}"
 
+_NEWLINE_RE = re.compile(r"\r\n|\r")
+
+# What MIMEText(body).as_bytes() emits ahead of the to/subject headers, for
+# an ASCII body and for one that needs encoding
+_ASCII_DRAFT_HEAD = 'Content-Type: text/plain; charset="us-ascii"\nMIME-Version: 1.0\nContent-Transfer-Encoding: 7bit\n'
+_UTF8_DRAFT_HEAD = 'Content-Type: text/plain; charset="utf-8"\nMIME-Version: 1.0\nContent-Transfer-Encoding: base64\n'
+
+def _format_plain_draft(to_addr, subject, body):
+    """
+    Format a draft byte-for-byte like MIMEText would, without the email
+    generator. Returns None when the headers need encoding or folding.
+    """
+    headers = to_addr + subject
+    if len(to_addr) > 70 or len(subject) > 65 or "\n" in headers or "\r" in headers:
+        return None
+    if not headers.isascii():
+        return None
+    if body.isascii():
+        return f"{_ASCII_DRAFT_HEAD}to: {to_addr}\nsubject: {subject}\n\n{_NEWLINE_RE.sub(chr(10), body)}".encode("ascii")
+
+    try:
+        data = body.encode("utf-8")
+    except UnicodeEncodeError:
+        return None
+    # base64 body lines of 76 characters, i.e. 57 input bytes each
+    encoded = b"".join(binascii.b2a_base64(data[i:i + 57]) for i in range(0, len(data), 57))
+    return f"{_UTF8_DRAFT_HEAD}to: {to_addr}\nsubject: {subject}\n\n".encode("ascii") + encoded
+
+@lru_cache(maxsize=64)
+def encode_draft(to_addr, subject, body):
+    """
+    Serialize a draft to the base64 'raw' form the Gmail API expects.
+    Single-part MIMEText output is deterministic, so repeats are cached.
+    """
+    data = _format_plain_draft(to_addr, subject, body)
+    if data is not None:
+        return base64.urlsafe_b64encode(data).decode("ascii")
+
+    message = MIMEText(body)
+    message["to"] = to_addr
+    message["subject"] = subject
+    return base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
+
 @register_tool
 class CreateDraftTool(Tool):
     name = "create_draft"
@@ -385,17 +594,13 @@ class CreateDraftTool(Tool):
         subject = parts[1].strip()
         body = "|".join(parts[2:]).strip()
         
-        service, acct = get_gmail_service(account)
+        service, acct = await get_gmail_service(account)
         if service is None:
             return acct
         
         try:
-            message = MIMEText(body)
-            message["to"] = to_addr
-            message["subject"] = subject
-            
-            raw = base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
-            service.users().drafts().create(userId="me", body={"message": {"raw": raw}}).execute()
+            raw = encode_draft(to_addr, subject, body)
+            await gmail_execute(service.users().drafts().create(userId="me", body={"message": {"raw": raw}}))
             
             return f"Draft created in {acct}! To: {to_addr}, Subject: {subject}. Check Gmail Drafts."
             
@@ -1,12 +1,182 @@
 import re
+import time
+import socket
+import asyncio
 import ipaddress
+from typing import Optional
 from urllib.parse import urlparse
 from tools.base import Tool
 from core.tools import register_tool
 from duckduckgo_search import AsyncDDGS
 import httpx
-from bs4 import BeautifulSoup
-import html2text
+
+# selectolax's C parser is much faster than BeautifulSoup on large pages;
+# BeautifulSoup remains the fallback when it isn't installed
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+    from bs4 import BeautifulSoup
+
+MAX_CONTENT_BYTES = 5 * 1024 * 1024  # 5MB
+MAX_SEARCH_OUTPUT = 1500  # chars of web_search results given to the model
+
+# (query, max_results) -> (time.monotonic() when fetched, DuckDuckGo results).
+# Shared by web_search and quick_search, since agents often repeat a search
+# verbatim or follow one with the other.
+SEARCH_CACHE_TTL = 60
+SEARCH_CACHE_SIZE = 128
+_search_cache: dict[tuple[str, int], tuple[float, list]] = {}
+
+# One DuckDuckGo client for every search, so its HTTP session and
+# connections are reused instead of rebuilt per query
+_ddgs: Optional[AsyncDDGS] = None
+
+# Page chrome that isn't part of the content
+_BOILERPLATE_TAGS = frozenset(['script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript',
+                               'head', 'template', 'svg'])
+
+# Tags rendered as their own paragraph, and those that just start a new line
+_PARAGRAPH_TAGS = frozenset(['p', 'div', 'section', 'article', 'main', 'blockquote', 'pre',
+                             'table', 'ul', 'ol', 'dl', 'form', 'figure', 'hr'])
+_LINE_TAGS = frozenset(['br', 'tr', 'dt', 'dd'])
+_CELL_TAGS = frozenset(['td', 'th'])
+_EMPHASIS = {'em': '_', 'i': '_', 'strong': '**', 'b': '**'}
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _selectolax_events(html: str):
+    """Yield ("start", tag, href), ("text", text) and ("end", tag) for the page body, in document order."""
+    tree = HTMLParser(html)
+    root = tree.body or tree.root
+    if root is None:
+        return
+    # (node, closing) pairs; a closing entry emits the end tag once the children are done
+    stack = [(root, False)]
+    while stack:
+        node, closing = stack.pop()
+        tag = node.tag
+        if closing:
+            yield ("end", tag)
+        elif tag == '-text':
+            yield ("text", node.text(deep=False))
+        elif tag not in _BOILERPLATE_TAGS and tag != '_comment':
+            yield ("start", tag, node.attributes.get('href') if tag == 'a' else None)
+            stack.append((node, True))
+            children = []
+            child = node.child
+            while child is not None:
+                children.append((child, False))
+                child = child.next
+            stack.extend(reversed(children))
+
+
+def _bs4_events(html: str):
+    """BeautifulSoup version of _selectolax_events."""
+    from bs4 import Comment, NavigableString, Tag
+    soup = BeautifulSoup(html, 'html.parser')
+    stack = [(soup.body or soup, False)]
+    while stack:
+        node, closing = stack.pop()
+        if closing:
+            yield ("end", node.name)
+        elif isinstance(node, Tag):
+            if node.name in _BOILERPLATE_TAGS:
+                continue
+            yield ("start", node.name, node.get('href') if node.name == 'a' else None)
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.contents))
+        elif isinstance(node, NavigableString) and not isinstance(node, Comment):
+            yield ("text", str(node))
+
+
+def _html_to_markdown(html: str) -> str:
+    """
+    Render a page as light markdown (headings, lists, emphasis, links) in a
+    single walk of the parsed tree, skipping script, style, nav, footer and
+    header elements.
+    """
+    events = _selectolax_events(html) if HTMLParser is not None else _bs4_events(html)
+    out = []
+    links = []  # (index in out where the link text starts, href) for each open <a>
+    row_cells = []  # cells seen so far in each open <tr>, innermost last
+    in_pre = 0
+
+    for event in events:
+        kind, tag = event[0], event[1]
+        if kind == "text":
+            if in_pre:
+                out.append(tag)
+                continue
+            text = _WHITESPACE_RE.sub(' ', tag)
+            if not out or out[-1].endswith(('\n', ' ')):
+                text = text.lstrip(' ')
+            if text:
+                out.append(text)
+        elif kind == "start":
+            if tag in _PARAGRAPH_TAGS:
+                out.append('\n\n')
+                in_pre += tag == 'pre'
+            elif tag in _LINE_TAGS:
+                out.append('\n')
+                if tag == 'tr':
+                    row_cells.append(0)
+            elif tag in _CELL_TAGS:
+                # Cells of a row go on one line: Name | Price
+                if row_cells:
+                    if row_cells[-1]:
+                        if out and out[-1].endswith(' '):
+                            out[-1] = out[-1].rstrip(' ')
+                        out.append(' | ')
+                    row_cells[-1] += 1
+            elif tag == 'li':
+                out.append('\n* ')
+            elif len(tag) == 2 and tag[0] == 'h' and tag[1] in '123456':
+                out.append('\n\n' + '#' * int(tag[1]) + ' ')
+            elif tag in _EMPHASIS:
+                out.append(_EMPHASIS[tag])
+            elif tag == 'a':
+                links.append((len(out), event[2]))
+        else:
+            if tag in _PARAGRAPH_TAGS:
+                out.append('\n\n')
+                in_pre -= tag == 'pre'
+            elif len(tag) == 2 and tag[0] == 'h' and tag[1] in '123456':
+                out.append('\n\n')
+            elif tag == 'tr' and row_cells:
+                row_cells.pop()
+            elif tag in _EMPHASIS:
+                out.append(_EMPHASIS[tag])
+            elif tag == 'a' and links:
+                start, href = links.pop()
+                text = ''.join(out[start:]).strip()
+                # Same-page anchors and scripts aren't worth a URL
+                if text and href and not href.startswith(('#', 'javascript:')):
+                    out[start:] = [f'[{text}]({href})']
+
+    # Drop the spaces whitespace collapsing leaves at the end of lines
+    return re.sub(r'[ \t]+\n', '\n', ''.join(out))
+
+
+async def _ddg_text(query: str, max_results: int) -> list:
+    """DuckDuckGo text results for a query, served from a short-lived cache when possible."""
+    global _ddgs
+    key = (query, max_results)
+    hit = _search_cache.pop(key, None)
+    if hit is not None and time.monotonic() - hit[0] < SEARCH_CACHE_TTL:
+        # Re-insert so the dict stays in least-recently-used order
+        _search_cache[key] = hit
+        return hit[1]
+
+    if _ddgs is None:
+        # AsyncDDGS binds to the running loop, so it can't be built at import time
+        _ddgs = AsyncDDGS()
+    results = await _ddgs.atext(query, max_results=max_results, safesearch='moderate') or []
+
+    _search_cache[key] = (time.monotonic(), results)
+    if len(_search_cache) > SEARCH_CACHE_SIZE:
+        del _search_cache[next(iter(_search_cache))]
+    return results
 
 
 @register_tool
@@ -42,44 +212,41 @@ class WebSearchTool(Tool):
             max_results = 5
 
         try:
-            # Use AsyncDDGS for async search
-            async with AsyncDDGS() as ddgs:
-                # Get results
-                results = []
-                async for result in ddgs.text(
-                    query,
-                    max_results=max_results,
-                    safesearch='moderate'
-                ):
-                    results.append(result)
+            results = await _ddg_text(query, max_results)
+
+            if not results:
+                return f"No search results found for: {query}"
 
-                if not results:
-                    return f"No search results found for: {query}"
+            # Format results concisely
+            output = [f"Search results for '{query}':\n"]
+            # Length of the joined output so far, to stop formatting once it's
+            # past the context budget
+            output_len = len(output[0])
 
-                # Format results concisely
-                output = [f"Search results for '{query}':\n"]
+            for i, result in enumerate(results, 1):
+                if output_len > MAX_SEARCH_OUTPUT:
+                    break
 
-                for i, result in enumerate(results, 1):
-                    title = result.get('title', 'No title')
-                    if len(title) > 60:
-                        title = title[:60] + "..."
+                title = result.get('title', 'No title')
+                if len(title) > 60:
+                    title = title[:60] + "..."
 
-                    snippet = result.get('body', 'No description')
-                    if len(snippet) > 150:
-                        snippet = snippet[:150] + "..."
+                snippet = result.get('body', 'No description')
+                if len(snippet) > 150:
+                    snippet = snippet[:150] + "..."
 
-                    url = result.get('href', '')
+                url = result.get('href', '')
 
-                    output.append(f"{i}. {title}")
-                    output.append(f"   {snippet}")
-                    output.append(f"   URL: {url}\n")
+                entry = f"{i}. {title}\n   {snippet}\n   URL: {url}\n"
+                output.append(entry)
+                output_len += 1 + len(entry)
 
-                # Join and ensure we don't exceed reasonable context size
-                result_text = "\n".join(output)
-                if len(result_text) > 1500:
-                    result_text = result_text[:1500] + "\n... [results truncated]"
+            # Join and ensure we don't exceed reasonable context size
+            result_text = "\n".join(output)
+            if len(result_text) > MAX_SEARCH_OUTPUT:
+                result_text = result_text[:MAX_SEARCH_OUTPUT] + "\n... [results truncated]"
 
-                return result_text
+            return result_text
 
         except Exception as e:
             return f"Error searching web: {str(e)}"
@@ -112,23 +279,20 @@ class WebSearchQuickTool(Tool):
             max_results = 5
 
         try:
-            async with AsyncDDGS() as ddgs:
-                results = []
-                async for result in ddgs.text(query, max_results=max_results, safesearch='moderate'):
-                    results.append(result)
+            results = await _ddg_text(query, max_results)
 
-                if not results:
-                    return f"No results for: {query}"
+            if not results:
+                return f"No results for: {query}"
 
-                output = [f"Quick results for '{query}':\n"]
-                for i, result in enumerate(results, 1):
-                    title = result.get('title', 'No title')
-                    if len(title) > 50:
-                        title = title[:50] + "..."
-                    url = result.get('href', '')
-                    output.append(f"{i}. {title} - {url}")
+            output = [f"Quick results for '{query}':\n"]
+            for i, result in enumerate(results, 1):
+                title = result.get('title', 'No title')
+                if len(title) > 50:
+                    title = title[:50] + "..."
+                url = result.get('href', '')
+                output.append(f"{i}. {title} - {url}")
 
-                return "\n".join(output)
+            return "\n".join(output)
 
         except Exception as e:
             return f"Error: {str(e)}"
@@ -139,15 +303,42 @@ class FetchWebpageTool(Tool):
     name = "fetch_webpage"
     description = "Fetch and read content from a webpage. Params: URL (e.g., 'https://example.com/article')"
 
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Lazily create one pooled client so keep-alive connections are reused across fetches."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10.0,  # 10 second timeout
+                follow_redirects=True,
+                max_redirects=5,
+                headers={
+                    'User-Agent': 'Mozilla/5.0 (compatible; AssistantBot/1.0)'
+                },
+                limits=httpx.Limits(max_keepalive_connections=32)
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close the pooled HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
     def _is_private_ip(self, ip_str: str) -> bool:
         """Check if IP address is private/localhost."""
         try:
-            ip = ipaddress.ip_address(ip_str)
-            return ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+            # getaddrinfo reports scoped IPv6 addresses as "fe80::1%eth0"
+            ip = ipaddress.ip_address(ip_str.split('%', 1)[0])
         except ValueError:
-            return False
+            return True
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        return (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified)
 
-    def _validate_url(self, url: str) -> tuple[bool, str]:
+    async def _validate_url(self, url: str) -> tuple[bool, str]:
         """
         Validate URL for security.
         Returns: (is_valid, error_message)
@@ -168,26 +359,16 @@ class FetchWebpageTool(Tool):
             if not hostname:
                 return False, "Invalid URL: cannot extract hostname"
 
-            # Block localhost variants
-            localhost_patterns = ['localhost', '0.0.0.0', '127.', '::1', '0:0:0:0:0:0:0:1']
-            if any(hostname.startswith(pattern) or hostname == pattern.strip('.') for pattern in localhost_patterns):
-                return False, "Security: Cannot access localhost"
-
-            # Check if hostname is an IP address
-            # Try to resolve as IP
+            # Check every address the hostname resolves to, so names pointing
+            # at localhost or a private network are caught as well as raw IPs
             try:
-                if self._is_private_ip(hostname):
-                    return False, f"Security: Cannot access private IP addresses ({hostname})"
-            except Exception:
-                # Not an IP, that's fine - it's a domain name
-                pass
-
-            # Block private IP ranges in domain names (rare but possible)
-            private_ranges = ['10.', '172.16.', '172.17.', '172.18.', '172.19.', '172.20.',
-                            '172.21.', '172.22.', '172.23.', '172.24.', '172.25.', '172.26.',
-                            '172.27.', '172.28.', '172.29.', '172.30.', '172.31.', '192.168.']
-            if any(hostname.startswith(pattern) for pattern in private_ranges):
-                return False, f"Security: Cannot access private network ({hostname})"
+                infos = await asyncio.get_running_loop().getaddrinfo(hostname, None)
+            except socket.gaierror:
+                return False, f"Invalid URL: cannot resolve {hostname}"
+
+            for info in infos:
+                if self._is_private_ip(info[4][0]):
+                    return False, f"Security: Cannot access private network ({hostname})"
 
             return True, ""
 
@@ -210,22 +391,16 @@ class FetchWebpageTool(Tool):
         url = params.strip()
 
         # Validate URL
-        is_valid, error_msg = self._validate_url(url)
+        is_valid, error_msg = await self._validate_url(url)
         if not is_valid:
             return f"Error: {error_msg}"
 
         try:
-            # Create async HTTP client with security settings
-            async with httpx.AsyncClient(
-                timeout=10.0,  # 10 second timeout
-                follow_redirects=True,
-                max_redirects=5,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (compatible; AssistantBot/1.0)'
-                }
-            ) as client:
-                # Fetch the page
-                response = await client.get(url)
+            client = self._get_client()
+
+            # Stream the page so oversized or unsupported responses are
+            # rejected without downloading them
+            async with client.stream("GET", url) as response:
                 response.raise_for_status()
 
                 # Check content type
@@ -235,46 +410,40 @@ class FetchWebpageTool(Tool):
                 if not any(allowed in content_type for allowed in allowed_types):
                     return f"Error: Unsupported content type: {content_type}. Only text-based content allowed."
 
-                # Check content size (5MB limit)
-                content_length = len(response.content)
-                if content_length > 5 * 1024 * 1024:  # 5MB
-                    return f"Error: Content too large ({content_length} bytes). Maximum 5MB allowed."
-
-                # Get text content
-                text = response.text
+                # Check content size (5MB limit), up front when the server declares it
+                declared_length = response.headers.get('content-length', '')
+                if declared_length.isdigit() and int(declared_length) > MAX_CONTENT_BYTES:
+                    return f"Error: Content too large ({declared_length} bytes). Maximum 5MB allowed."
 
-                # If HTML, parse and extract text
-                if 'html' in content_type:
-                    soup = BeautifulSoup(text, 'html.parser')
+                body = bytearray()
+                async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                    body += chunk
+                    if len(body) > MAX_CONTENT_BYTES:
+                        return f"Error: Content too large (over {MAX_CONTENT_BYTES} bytes). Maximum 5MB allowed."
 
-                    # Remove script, style, nav, footer, header elements
-                    for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript']):
-                        element.decompose()
-
-                    # Convert to markdown for better readability
-                    h = html2text.HTML2Text()
-                    h.ignore_links = False
-                    h.ignore_images = True
-                    h.ignore_emphasis = False
-                    h.body_width = 0  # Don't wrap text
+                # Get text content
+                text = body.decode(response.encoding or 'utf-8', errors='replace')
 
-                    cleaned_text = h.handle(str(soup))
-                else:
-                    # For non-HTML content, use as-is
-                    cleaned_text = text
+            # If HTML, parse and extract text
+            if 'html' in content_type:
+                # Convert to markdown for better readability
+                cleaned_text = _html_to_markdown(text)
+            else:
+                # For non-HTML content, use as-is
+                cleaned_text = text
 
-                # Remove excessive whitespace
-                cleaned_text = re.sub(r'\n\s*\n\s*\n', '\n\n', cleaned_text)
-                cleaned_text = cleaned_text.strip()
+            # Remove excessive whitespace
+            cleaned_text = re.sub(r'\n\s*\n\s*\n', '\n\n', cleaned_text)
+            cleaned_text = cleaned_text.strip()
 
-                # Truncate to 3000 chars to preserve context
-                if len(cleaned_text) > 3000:
-                    cleaned_text = cleaned_text[:3000] + "\n\n... [Content truncated at 3000 characters]"
+            # Truncate to 3000 chars to preserve context
+            if len(cleaned_text) > 3000:
+                cleaned_text = cleaned_text[:3000] + "\n\n... [Content truncated at 3000 characters]"
 
-                if not cleaned_text:
-                    return "Error: No text content found on page"
+            if not cleaned_text:
+                return "Error: No text content found on page"
 
-                return f"Content from {url}:\n\n{cleaned_text}"
+            return f"Content from {url}:\n\n{cleaned_text}"
 
         except httpx.TimeoutException:
             return f"Error: Request timed out after 10 seconds for {url}"
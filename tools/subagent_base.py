@@ -1,8 +1,12 @@
+import asyncio
+import time
 from abc import abstractmethod
+from starlette.websockets import WebSocketState
 from tools.base import Tool
 from core.ollama_client import OllamaClient
-from core.tools import execute_tool, parse_tool_call, get_tool_list_filtered
+from core.tools import execute_tool, scan_response, parse_tool_calls, get_tool_list_filtered, get_tool_list_version, ToolCallStreamParser
 from core.memory import process_memory_update
+import orjson
 import config
 
 class SubagentTool(Tool):
@@ -19,12 +23,18 @@ class SubagentTool(Tool):
             base_url=config.OLLAMA_BASE_URL,
             model=config.OLLAMA_MODEL
         )
+        # depth -> (tool list version, rendered system prompt)
+        self._prompt_cache: dict[int, tuple[int, str]] = {}
+
+    async def aclose(self):
+        """Close this subagent's Ollama client."""
+        await self.ollama.aclose()
 
     async def run(self, params: str) -> str:
         """Execute subagent with task delegation."""
         from core.tools import _current_depth
 
-        depth = _current_depth + 1
+        depth = _current_depth.get() + 1
 
         # Check max depth
         if depth > config.SUBAGENT_MAX_DEPTH:
@@ -45,80 +55,104 @@ class SubagentTool(Tool):
             # Get AI response
             full_response = await self._get_full_response(messages)
 
+            tags = scan_response(full_response)
+
             # Process memory updates
-            full_response = process_memory_update(full_response)
+            if "MEMORY_UPDATE" in tags:
+                full_response = process_memory_update(full_response)
 
-            # Check for tool call
-            tool_call = parse_tool_call(full_response)
+            # Check for tool calls
+            tool_calls = parse_tool_calls(full_response) if "TOOL" in tags else []
 
-            if not tool_call:
+            if not tool_calls:
                 # No tool call - return final response
                 return full_response
 
-            tool_name, tool_params = tool_call
-
-            # Send subagent tool start to UI if websocket available
-            from core import tools
-            import time
-            import json
-            websocket = tools._current_websocket
-
-            if websocket:
-                try:
-                    msg = json.dumps({
-                        "type": "subagent_tool_start",
-                        "tool_name": tool_name,
-                        "params": tool_params,
-                        "subagent": self.name,
-                        "iteration": iteration
-                    })
-                    await websocket.send_text(msg)
-                except:
-                    pass  # Don't fail if websocket send fails
-
-            # Execute tool at increased depth
-            old_depth = tools._current_depth
-            tools._current_depth = depth
-            start_time = time.time()
-            try:
-                tool_result = await execute_tool(tool_name, tool_params, depth)
-            finally:
-                tools._current_depth = old_depth
-
-            # Send subagent tool end to UI
-            if websocket:
-                try:
-                    elapsed = time.time() - start_time
-                    msg = json.dumps({
-                        "type": "subagent_tool_end",
-                        "tool_name": tool_name,
-                        "result": tool_result[:200] + ("..." if len(tool_result) > 200 else ""),
-                        "duration": round(elapsed, 2)
-                    })
-                    await websocket.send_text(msg)
-                except:
-                    pass
+            # Independent tool calls in one response run concurrently
+            results = await asyncio.gather(
+                *(self._run_tool(name, tool_params, depth, iteration) for name, tool_params in tool_calls)
+            )
 
             # Append to conversation
             messages.append({"role": "assistant", "content": full_response})
-            messages.append({"role": "user", "content": f"[Tool Result from {tool_name}]: {tool_result}"})
+            messages.append({"role": "user", "content": "\n\n".join(
+                f"[Tool Result from {name}]: {result}" for (name, _), result in zip(tool_calls, results)
+            )})
 
         # Max iterations reached
         return f"Subagent reached max iterations ({self.max_iterations}). Last response: {full_response[:200]}..."
 
+    async def _run_tool(self, tool_name: str, tool_params: str, depth: int, iteration: int) -> str:
+        """Execute one tool call at increased depth, reporting it to the UI."""
+        from core import tools
+        websocket = tools._current_websocket.get()
+        # Skip building UI updates nobody can receive
+        if websocket is not None and websocket.client_state != WebSocketState.CONNECTED:
+            websocket = None
+
+        # Send subagent tool start to UI if websocket available
+        if websocket:
+            try:
+                msg = orjson.dumps({
+                    "type": "subagent_tool_start",
+                    "tool_name": tool_name,
+                    "params": tool_params,
+                    "subagent": self.name,
+                    "iteration": iteration
+                }).decode()
+                await websocket.send_text(msg)
+            except:
+                pass  # Don't fail if websocket send fails
+
+        start_time = time.monotonic()
+        tool_result = await execute_tool(tool_name, tool_params, depth)
+
+        # Send subagent tool end to UI
+        if websocket:
+            try:
+                elapsed = time.monotonic() - start_time
+                msg = orjson.dumps({
+                    "type": "subagent_tool_end",
+                    "tool_name": tool_name,
+                    "result": tool_result[:200] + ("..." if len(tool_result) > 200 else ""),
+                    "duration": round(elapsed, 2)
+                }).decode()
+                await websocket.send_text(msg)
+            except:
+                pass
+
+        return tool_result
+
     def _build_system_prompt(self, depth: int) -> str:
         """Build system prompt with tools (NO memory for lean context)."""
+        version = get_tool_list_version()
+        cached = self._prompt_cache.get(depth)
+        if cached and cached[0] == version:
+            return cached[1]
+
         tools = get_tool_list_filtered(depth)
 
         depth_notice = ""
         if depth >= config.SUBAGENT_MAX_DEPTH:
             depth_notice = "\n\nIMPORTANT: You are at maximum nesting depth. You cannot delegate to other subagents."
 
-        return self.system_prompt_template.format(tools=tools) + depth_notice
+        prompt = self.system_prompt_template.format(tools=tools) + depth_notice
+        self._prompt_cache[depth] = (version, prompt)
+        return prompt
 
     async def _get_full_response(self, messages: list) -> str:
         """Get complete response from Ollama."""
         chunks = []
-        async for chunk in self.ollama.chat(messages):
-            chunks.append(chunk)
+        tool_stream = ToolCallStreamParser()
+        stream = self.ollama.chat(messages)
+        try:
+            async for chunk in stream:
+                # No need to keep generating once the model is done calling tools,
+                # nor to keep what it wrote after them
+                if tool_stream.feed(chunk):
+                    chunks.append(chunk[:tool_stream.cut])
+                    break
+                chunks.append(chunk)
+        finally:
+            await stream.aclose()
         return "".join(chunks)
@@ -1,6 +1,10 @@
 from tools.base import Tool
 from core.tools import register_tool
+import ast
 import datetime
+import math
+import operator
+from functools import lru_cache
 
 @register_tool
 class TimeTool(Tool):
@@ -11,6 +15,49 @@ class TimeTool(Tool):
         now = datetime.datetime.now()
         return f"Current time: {now.strftime('%Y-%m-%d %H:%M:%S')}"
 
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+# Bigger integers can take minutes and gigabytes to build, and Python won't
+# print past 4300 digits anyway, so products and powers are size-checked
+# before computing them
+MAX_RESULT_BITS = 14000  # about 4200 digits
+
+def _result_bits(op: ast.operator, left, right) -> float:
+    """Size in bits of an integer product or power (within a bit), 0 if not applicable."""
+    if type(left) is not int or type(right) is not int:
+        return 0
+    if isinstance(op, ast.Mult):
+        return left.bit_length() + right.bit_length()
+    if isinstance(op, ast.Pow) and right > 0 and abs(left) > 1:
+        return math.log2(abs(left)) * right
+    return 0
+
+@lru_cache(maxsize=1024)
+def _parse_expression(expression: str) -> ast.expr:
+    return ast.parse(expression.strip(), mode="eval").body
+
+def _evaluate(node: ast.expr):
+    """Evaluate an arithmetic expression tree, rejecting anything but numbers and operators."""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        left = _evaluate(node.left)
+        right = _evaluate(node.right)
+        if _result_bits(node.op, left, right) > MAX_RESULT_BITS:
+            raise ValueError(f"Result too large (max {MAX_RESULT_BITS} bits)")
+        return _BINARY_OPS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        return _UNARY_OPS[type(node.op)](_evaluate(node.operand))
+    raise ValueError("Only numbers and +-*/() allowed")
+
 @register_tool
 class CalculatorTool(Tool):
     name = "calculate"
@@ -18,11 +65,7 @@ class CalculatorTool(Tool):
 
     async def run(self, params: str) -> str:
         try:
-            # Only allow safe math operations
-            allowed = set('0123456789+-*/.() ')
-            if not all(c in allowed for c in params):
-                return "Error: Only numbers and +-*/() allowed"
-            result = eval(params)
+            result = _evaluate(_parse_expression(params))
             return f"Result: {result}"
         except Exception as e:
             return f"Error: {str(e)}"
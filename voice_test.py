@@ -29,6 +29,10 @@ PARTIAL_INTERVAL_MS = 500  # Update partials every 500ms
 FINAL_SILENCE_MS = 800  # Finalize after 800ms silence
 MIN_SPEECH_MS = 300  # Ignore very short speech
 MAX_BUFFER_S = 60  # Max audio buffer size
+# What Whisper tends to "hear" in noise that VAD let through, compared lowercased
+HALLUCINATIONS = frozenset({"", ".", "you", "thank you", "thank you.", "thanks.", "thanks for watching!"})
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "distil-large-v3")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8_float16")
 
 
 class RingBuffer:
@@ -39,6 +43,8 @@ class RingBuffer:
         self.buffer = np.zeros(self.max_samples, dtype=np.float32)
         self.write_pos = 0
         self.total_written = 0
+        # Moving average of the mean-square level of recent writes (~0.6s at 32ms chunks)
+        self.energy = 0.0
 
     def write(self, data: np.ndarray):
         """Write audio data to buffer."""
@@ -46,6 +52,8 @@ class RingBuffer:
         if n == 0:
             return
 
+        self.energy = 0.95 * self.energy + 0.05 * float(np.dot(data, data)) / n
+
         if n >= self.max_samples:
             self.buffer[:] = data[-self.max_samples:]
             self.write_pos = 0
@@ -60,20 +68,29 @@ class RingBuffer:
             self.write_pos = end_pos % self.max_samples
         self.total_written += n
 
-    def get_last(self, n_samples: int) -> np.ndarray:
-        """Get last N samples from buffer."""
+    def has_energy(self, threshold: float = 0.01) -> bool:
+        """Whether recent audio is louder than threshold (RMS), without scanning the buffer."""
+        return self.energy > threshold * threshold
+
+    def get_last(self, n_samples: int, out: np.ndarray = None) -> np.ndarray:
+        """
+        Get last N samples from buffer.
+        Returns a view of the buffer when the samples are contiguous, which stays
+        valid until the buffer wraps around to them (MAX_BUFFER_S later); samples
+        that wrap are joined into out when given, else a new array.
+        """
         n_samples = min(n_samples, self.max_samples, self.total_written)
         if n_samples == 0:
             return np.array([], dtype=np.float32)
 
         if n_samples <= self.write_pos:
-            return self.buffer[self.write_pos - n_samples:self.write_pos].copy()
+            return self.buffer[self.write_pos - n_samples:self.write_pos]
         else:
             first_part = n_samples - self.write_pos
             return np.concatenate([
                 self.buffer[-first_part:],
                 self.buffer[:self.write_pos]
-            ])
+            ], out=out[:n_samples] if out is not None else None)
 
 
 class SileroVAD:
@@ -88,6 +105,10 @@ class SileroVAD:
             trust_repo=True
         )
         self.model.eval()
+        # The VAD runs on the CPU over 512-sample chunks; extra intra-op
+        # threads only add dispatch overhead and compete with Whisper's
+        # decode loop for cores
+        torch.set_num_threads(1)
 
     def reset(self):
         """Reset internal states between utterances."""
@@ -97,8 +118,10 @@ class SileroVAD:
         """Check if audio chunk contains speech."""
         if len(audio) == 0:
             return False
-        tensor = torch.from_numpy(audio).float()
-        prob = self.model(tensor, SAMPLE_RATE).item()
+        # from_numpy shares the (already float32) chunk's memory, and
+        # inference_mode skips autograd bookkeeping on this ~30Hz path
+        with torch.inference_mode():
+            prob = self.model(torch.from_numpy(audio), SAMPLE_RATE).item()
         return prob > threshold
 
 
@@ -115,8 +138,8 @@ def has_audio_energy(audio: np.ndarray, threshold: float = 0.01) -> bool:
 
 def main():
     # Initialize components
-    print("Loading Whisper large-v3 on GPU 1...")
-    whisper = WhisperModel("large-v3", device="cuda", compute_type="float16")
+    print(f"Loading Whisper {WHISPER_MODEL} on GPU 1...")
+    whisper = WhisperModel(WHISPER_MODEL, device="cuda", compute_type=WHISPER_COMPUTE_TYPE)
 
     vad = SileroVAD()
     buffer = RingBuffer(MAX_BUFFER_S, SAMPLE_RATE)
@@ -127,6 +150,12 @@ def main():
     last_speech_time = None
     last_partial_time = 0
     previous_context = ""
+    # Partials only re-transcribe the utterance past the segments Whisper has
+    # already closed, so each update costs the open tail instead of everything
+    partial_text = ""
+    partial_samples = 0
+    partial_audio = np.empty(SAMPLE_RATE * 10, dtype=np.float32)  # reused when the ring wraps
+    vad_written = 0  # buffer.total_written as of the last VAD check
 
     chunk_samples = int(SAMPLE_RATE * CHUNK_MS / 1000)  # 480 samples at 30ms
 
@@ -152,13 +181,18 @@ def main():
         stream.start()
 
         while True:
-            current_time = time.time() * 1000  # ms
+            current_time = time.monotonic_ns() // 1_000_000  # ms, immune to wall-clock jumps
 
-            # Get last 30ms for VAD check
-            chunk = buffer.get_last(chunk_samples)
-            if len(chunk) < chunk_samples:
+            # Score each chunk once: the loop wakes about three times per
+            # 32ms chunk, and re-running the VAD on audio it has already seen
+            # is wasted work (and skews its recurrent state)
+            if buffer.total_written - vad_written < chunk_samples:
                 time.sleep(0.01)
                 continue
+            vad_written = buffer.total_written
+
+            # Get last 30ms for VAD check
+            chunk = buffer.get_last(chunk_samples)
 
             is_speech = vad.is_speech(chunk)
 
@@ -181,19 +215,28 @@ def main():
 
                     if (current_time - last_partial_time >= PARTIAL_INTERVAL_MS
                             and speech_duration >= MIN_SPEECH_MS):
-                        # Get audio from speech start
+                        # Get audio from the end of the last closed segment
                         n_samples = int(speech_duration * SAMPLE_RATE / 1000)
-                        audio = buffer.get_last(min(n_samples, SAMPLE_RATE * 10))  # Max 10s
+                        tail_samples = n_samples - partial_samples
+                        audio = buffer.get_last(min(tail_samples, SAMPLE_RATE * 10), out=partial_audio)  # Max 10s
 
-                        if len(audio) > 0 and has_audio_energy(audio):
+                        if len(audio) > 0 and buffer.has_energy():
+                            context = (previous_context + " " + partial_text)[-200:].strip()
                             segments, _ = whisper.transcribe(
                                 audio,
                                 language="en",
                                 beam_size=1,
                                 best_of=1,
-                                initial_prompt=previous_context[-200:] if previous_context else None,
+                                initial_prompt=context or None,
                             )
-                            text = " ".join(s.text.strip() for s in segments)
+                            segments = list(segments)
+                            if len(segments) > 1:
+                                # Whisper won't revise segments followed by another one
+                                closed = segments[:-1]
+                                partial_text += " " + " ".join(s.text.strip() for s in closed)
+                                partial_samples += tail_samples - len(audio) + int(closed[-1].end * SAMPLE_RATE)
+                                segments = segments[-1:]
+                            text = (partial_text + " " + " ".join(s.text.strip() for s in segments)).strip()
                             if text:
                                 # Clear line fully before printing partial
                                 print(f"\r{' ' * 80}\r[...] {text}", end="", flush=True)
@@ -229,8 +272,8 @@ def main():
                                 initial_prompt=previous_context[-200:] if previous_context else None,
                             )
                             text = " ".join(s.text.strip() for s in segments)
-                            # Skip Whisper's most common hallucination
-                            if text and text.strip().lower() not in ("thank you.", "thank you", "thanks."):
+                            # Skip Whisper's most common hallucinations
+                            if text.strip().lower() not in HALLUCINATIONS:
                                 # Clear line fully before printing final
                                 print(f"\r{' ' * 80}\r>>> {text}")
                                 previous_context += " " + text
@@ -239,6 +282,8 @@ def main():
                         state = IDLE
                         speech_start_time = None
                         last_speech_time = None
+                        partial_text = ""
+                        partial_samples = 0
                         vad.reset()  # Reset VAD state for next utterance
 
             time.sleep(0.01)  # 10ms loop
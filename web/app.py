@@ -1,53 +1,141 @@
-import re
 import bcrypt
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Form, HTTPException
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse
-from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from fastapi.responses import HTMLResponse, RedirectResponse, ORJSONResponse
+from itsdangerous import URLSafeTimedSerializer, TimestampSigner, BadSignature, SignatureExpired
 from starlette.middleware.sessions import SessionMiddleware
-import sys
+from starlette.middleware.gzip import GZipMiddleware
 import os
-import json
-from datetime import datetime, timezone
+import orjson
+import base64
+import asyncio
 import time
-
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 
 import config
 from core.ollama_client import OllamaClient
-from core.memory import read_memory, update_memory, process_memory_update
-from core.tools import parse_tool_call, strip_tool_call, execute_tool, get_tool_list, parse_thinking, strip_thinking, TOOLS
+from core import token_refresher
+from core.memory import read_memory, process_memory_update, memory_mtime
+from core.tools import scan_response, split_tool_calls, strip_tool_call, execute_tools_parallel, get_tool_list, get_tool_list_version, take_thinking, StreamDisplayFilter, ToolCallStreamParser, TOOLS
 
-import tools  # This registers all tools
+from tools import stt_tool  # importing the package registers all tools
 
 print(f"STARTUP: Registered tools: {list(TOOLS.keys())}")
 
-app = FastAPI(title=config.ASSISTANT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    token_refresher.start()
+    # Load Whisper in the background so the first listen doesn't stall on it
+    asyncio.get_running_loop().run_in_executor(None, stt_tool.warmup)
+    session_reaper = asyncio.create_task(reap_idle_sessions())
+    yield
+    session_reaper.cancel()
+    await token_refresher.stop()
+    await ollama.aclose()
+    # Subagents and some tools hold their own HTTP clients
+    for tool in TOOLS.values():
+        await tool.aclose()
+
+app = FastAPI(title=config.ASSISTANT_NAME, default_response_class=ORJSONResponse, lifespan=lifespan)
 app.add_middleware(SessionMiddleware, secret_key=config.SECRET_KEY)
+# Pages and JSON over 500 bytes go out gzipped; websocket traffic isn't touched
+app.add_middleware(GZipMiddleware, minimum_size=500)
 
-templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
+templates_dir = os.path.join(os.path.dirname(__file__), "templates")
+templates = Jinja2Templates(directory=templates_dir)
+# Rendered pages by (template, context), with the template's mtime when rendered
+_page_cache: dict[tuple, tuple[int, str]] = {}
 
 static_path = os.path.join(os.path.dirname(__file__), "static")
 if os.path.exists(static_path):
     app.mount("/static", StaticFiles(directory=static_path), name="static")
 
 ollama = OllamaClient()
-conversations: dict[str, list] = {}
+# (last activity, websocket) by chat session, least recently used first
+conversations: OrderedDict[int, tuple[float, WebSocket]] = OrderedDict()
 serializer = URLSafeTimedSerializer(config.SECRET_KEY)
 
+_password_hash = config.PASSWORD_HASH.encode()
+
 def verify_password(password: str) -> bool:
-    return bcrypt.checkpw(password.encode(), config.PASSWORD_HASH.encode())
+    return bcrypt.checkpw(password.encode(), _password_hash)
+
+# Failed logins per client IP: ip -> (failures, monotonic time of the first one),
+# oldest first. The IP is the TCP peer, so behind a reverse proxy every client
+# shares the proxy's address and five failures from anyone lock out everyone
+# until the window passes.
+LOGIN_MAX_FAILURES = 5
+LOGIN_FAILURE_WINDOW = 300  # seconds
+LOGIN_TRACKED_IPS = 1024
+_login_failures: dict[str, tuple[int, float]] = {}
+
+def login_blocked(ip: str) -> bool:
+    """Whether ip has used up its failed login attempts for the current window."""
+    entry = _login_failures.get(ip)
+    if entry is None:
+        return False
+    if time.monotonic() - entry[1] > LOGIN_FAILURE_WINDOW:
+        del _login_failures[ip]
+        return False
+    return entry[0] >= LOGIN_MAX_FAILURES
+
+def record_login_failure(ip: str):
+    now = time.monotonic()
+    if ip not in _login_failures and len(_login_failures) >= LOGIN_TRACKED_IPS:
+        # Entries are otherwise only pruned when their IP comes back
+        for stale_ip, (_, first) in list(_login_failures.items()):
+            if now - first <= LOGIN_FAILURE_WINDOW:
+                break
+            del _login_failures[stale_ip]
+        if len(_login_failures) >= LOGIN_TRACKED_IPS:
+            del _login_failures[next(iter(_login_failures))]
+    count, first = _login_failures.get(ip, (0, now))
+    _login_failures[ip] = (count + 1, first)
 
 def create_session_token() -> str:
     return serializer.dumps({"authenticated": True})
 
+# Recently verified session tokens -> monotonic time of verification, so a
+# client's burst of requests checks the signature once. Failures aren't cached.
+TOKEN_CACHE_TTL = 5  # seconds
+TOKEN_CACHE_SIZE = 1024
+_verified_tokens: dict[str, float] = {}
+
 def verify_session_token(token: str) -> bool:
+    now = time.monotonic()
+    verified_at = _verified_tokens.get(token)
+    if verified_at is not None:
+        if now - verified_at < TOKEN_CACHE_TTL:
+            return True
+        del _verified_tokens[token]
+
     try:
         data = serializer.loads(token, max_age=config.SESSION_EXPIRY)
-        return data.get("authenticated", False)
     except (BadSignature, SignatureExpired):
         return False
+    if not data.get("authenticated", False):
+        return False
+
+    if len(_verified_tokens) >= TOKEN_CACHE_SIZE:
+        del _verified_tokens[next(iter(_verified_tokens))]
+    _verified_tokens[token] = now
+    return True
+
+# Signs the "session" cookie the same way SessionMiddleware does
+session_signer = TimestampSigner(str(config.SECRET_KEY))
+
+def verify_ws_session(session_cookie: str) -> bool:
+    """Check a raw session cookie for a valid auth token (websockets bypass SessionMiddleware)."""
+    try:
+        data = session_signer.unsign(session_cookie, max_age=config.SESSION_EXPIRY)
+        auth_token = orjson.loads(base64.b64decode(data)).get("auth_token")
+        return bool(auth_token) and verify_session_token(auth_token)
+    except (BadSignature, ValueError, AttributeError) as e:
+        # Bad signature, bad base64/JSON, or JSON that isn't an object
+        print(f"Auth error: {e}")
+        return False
 
 def get_current_user(request: Request):
     token = request.session.get("auth_token")
@@ -55,39 +143,137 @@ def get_current_user(request: Request):
         return None
     return True
 
-def get_system_prompt() -> str:
-    memory = read_memory()
-    tool_list = get_tool_list()
-    return config.SYSTEM_PROMPT.format(memory=memory, tools=tool_list)
-
-def extract_text_before_tool(response: str) -> str:
-    pattern = r"\[TOOL:[^\]]+\].*?\[/TOOL\]"
-    match = re.search(pattern, response, re.DOTALL)
-    if match:
-        return response[:match.start()].strip()
-    return response.strip()
+# Rendered system prompt, keyed on (tool registry version, memory file mtime)
+_system_prompt_cache = {"key": None, "prompt": ""}
+
+async def get_system_prompt() -> str:
+    key = (get_tool_list_version(), memory_mtime())
+    if _system_prompt_cache["key"] != key:
+        # Only a changed memory file is actually read; do that off the event loop
+        memory = await asyncio.to_thread(read_memory)
+        tool_list = get_tool_list()
+        _system_prompt_cache["prompt"] = config.render_system_prompt(tools=tool_list, memory=memory)
+        _system_prompt_cache["key"] = key
+    return _system_prompt_cache["prompt"]
+
+def touch_session(session_id: int, websocket: WebSocket):
+    """Mark a session as most recently used."""
+    conversations[session_id] = (time.monotonic(), websocket)
+    conversations.move_to_end(session_id)
+
+# Close code telling the client its session expired, so it clears the chat
+# before reconnecting instead of showing history the model no longer has
+SESSION_EXPIRED_CLOSE_CODE = 4000
+
+async def reap_idle_sessions():
+    """Every minute, close chat connections idle for longer than SESSION_EXPIRY."""
+    while True:
+        await asyncio.sleep(60)
+        cutoff = time.monotonic() - config.SESSION_EXPIRY
+        # Least recently used first, so stop at the first active session
+        while conversations:
+            session_id, (last_active, websocket) = next(iter(conversations.items()))
+            if last_active > cutoff:
+                break
+            del conversations[session_id]
+            # The handler's receive fails, and it cleans up the rest of the session
+            try:
+                await websocket.close(code=SESSION_EXPIRED_CLOSE_CODE, reason="Session expired")
+            except Exception as e:
+                print(f"Closing idle session failed: {e}")
+
+def trim_history(history: list) -> list:
+    """
+    Drop the oldest messages once the history outgrows MAX_HISTORY_MESSAGES or
+    MAX_HISTORY_TOKENS, so each turn's prompt stays bounded. The kept history
+    always starts at a user message. Returns the dropped messages.
+    """
+    budget = config.MAX_HISTORY_TOKENS * 4  # rough chars-per-token estimate
+    total = sum(len(m["content"]) for m in history)
+    if len(history) <= config.MAX_HISTORY_MESSAGES and total <= budget:
+        return []
+
+    # Trimming changes the start of the prompt, which throws away Ollama's
+    # cached prefix, so cut down to 3/4 of the limits to leave room for a
+    # few turns before the next trim
+    max_messages = config.MAX_HISTORY_MESSAGES * 3 // 4
+    budget = budget * 3 // 4
+    drop = 0
+    # Always keep the newest message, even if it alone is over budget
+    while drop < len(history) - 1 and (len(history) - drop > max_messages or total > budget):
+        total -= len(history[drop]["content"])
+        drop += 1
+    while drop < len(history) - 1 and history[drop]["role"] != "user":
+        drop += 1
+    dropped = history[:drop]
+    del history[:drop]
+    return dropped
+
+async def summarize_history(summary: str, dropped: list) -> str:
+    """Fold messages trimmed from the history into the running conversation summary."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in dropped)
+    prompt = (
+        "Summarize this conversation in a few sentences, keeping facts, names, "
+        "decisions and anything the user asked to remember."
+    )
+    if summary:
+        prompt += f"\n\nSummary so far:\n{summary}"
+    prompt += f"\n\nConversation:\n{transcript}"
+    parts = []
+    async for chunk in ollama.chat([{"role": "user", "content": prompt}], stream=False):
+        parts.append(chunk)
+    return "".join(parts).strip()
+
+def render_page(name: str, status_code: int = 200, **context) -> HTMLResponse:
+    """
+    Render a template that doesn't use the request. The few (template, context)
+    combinations are cached and only re-rendered when the template file changes.
+    """
+    mtime = os.stat(os.path.join(templates_dir, name)).st_mtime_ns
+    key = (name, *context.items())
+    cached = _page_cache.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = _page_cache[key] = (mtime, templates.get_template(name).render(**context))
+    return HTMLResponse(cached[1], status_code=status_code)
+
+# Injected into each turn's messages; never modified, so the same dicts are shared
+PLANNING_PROMPT = {
+    "role": "user",
+    "content": "Before using tools, think through your strategy: Review what you already know from our conversation. What information have you already gathered? What's still missing? Use what you know to be efficient - don't re-search things you've already found. Output your plan in [THINKING]...[/THINKING] tags."
+}
+REFLECTION_PROMPT = {
+    "role": "user",
+    "content": "Progress check: Are you making progress? If yes, continue carefully. If no, try ONE different approach (different keywords, broader search, different account). Don't launch many tools at once - be strategic and measured."
+}
 
 def create_message(msg_type: str, **kwargs) -> str:
-    """Create JSON message with timestamp."""
+    """Create JSON message with timestamp (ms since the epoch; the client passes it to new Date())."""
     data = {
         "type": msg_type,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": time.time_ns() // 1_000_000,
         **kwargs
     }
-    return json.dumps(data)
+    return orjson.dumps(data).decode()
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     if get_current_user(request):
         return RedirectResponse(url="/", status_code=302)
-    return templates.TemplateResponse("login.html", {"request": request, "error": None})
+    return render_page("login.html", error=None)
 
 @app.post("/login")
 async def login(request: Request, password: str = Form(...)):
-    if verify_password(password):
+    ip = request.client.host if request.client else ""
+    if login_blocked(ip):
+        return render_page("login.html", status_code=429, error="Too many failed attempts. Try again later.")
+
+    # bcrypt is deliberately slow (~100ms of CPU); keep it off the event loop
+    if await asyncio.to_thread(verify_password, password):
+        _login_failures.pop(ip, None)
         request.session["auth_token"] = create_session_token()
         return RedirectResponse(url="/", status_code=302)
-    return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid password"})
+    record_login_failure(ip)
+    return render_page("login.html", error="Invalid password")
 
 @app.get("/logout")
 async def logout(request: Request):
@@ -98,13 +284,13 @@ async def logout(request: Request):
 async def home(request: Request):
     if not get_current_user(request):
         return RedirectResponse(url="/login", status_code=302)
-    return templates.TemplateResponse("index.html", {"request": request, "assistant_name": config.ASSISTANT_NAME})
+    return render_page("index.html", assistant_name=config.ASSISTANT_NAME)
 
 @app.get("/memory")
 async def get_memory_endpoint(request: Request):
     if not get_current_user(request):
         raise HTTPException(status_code=401, detail="Not authenticated")
-    return {"memory": read_memory()}
+    return {"memory": await asyncio.to_thread(read_memory)}
 
 @app.get("/tools")
 async def list_tools(request: Request):
@@ -122,196 +308,218 @@ async def websocket_chat(websocket: WebSocket):
         await websocket.close(code=4001, reason="Not authenticated")
         return
 
-    # Decode session to verify auth (must match SessionMiddleware's format)
-    try:
-        from itsdangerous import TimestampSigner, BadSignature
-        import base64
-        import json
-
-        signer = TimestampSigner(str(config.SECRET_KEY))
-        data = signer.unsign(session_cookie, max_age=config.SESSION_EXPIRY)
-        session_data = json.loads(base64.b64decode(data))
-        auth_token = session_data.get("auth_token")
-        if not auth_token or not verify_session_token(auth_token):
-            await websocket.close(code=4001, reason="Not authenticated")
-            return
-    except (BadSignature, Exception) as e:
-        print(f"Auth error: {e}")
+    if not verify_ws_session(session_cookie):
         await websocket.close(code=4001, reason="Not authenticated")
         return
 
-    session_id = str(id(websocket))
-    conversations[session_id] = []
+    # The websocket outlives its entry (removed in the finally below), so its id can't be reused meanwhile
+    session_id = id(websocket)
+    history = []
+    touch_session(session_id, websocket)
+    # Turns trimmed from the history are summarized in the background once a
+    # reply has finished streaming, and the summary rides along after the
+    # system prompt. Until their summary is ready they are still sent as-is.
+    summary = ""
+    summary_task = None
+    unsummarized = []  # trimmed messages not yet covered by summary
+    summarizing = 0  # how many of them summary_task covers
 
     try:
         while True:
             data = await websocket.receive_text()
             print(f"USER: {data}")
-            sys.stdout.flush()
-            conversations[session_id].append({"role": "user", "content": data})
+            history.append({"role": "user", "content": data})
+            if summary_task is not None and summary_task.done():
+                try:
+                    summary = summary_task.result()
+                except Exception as e:
+                    # Lose those turns rather than let unsummarized grow without bound
+                    print(f"History summary failed: {e}")
+                del unsummarized[:summarizing]
+                summary_task = None
+            unsummarized += trim_history(history)
+            touch_session(session_id, websocket)
 
             # Echo user message to frontend with timestamp
             await websocket.send_text(create_message("user_message", content=data))
 
-            messages = [{"role": "system", "content": get_system_prompt()}]
-            messages.extend(conversations[session_id])
+            messages = [{"role": "system", "content": await get_system_prompt()}]
+            if summary:
+                messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+            messages.extend(unsummarized)
+            messages.extend(history)
 
             # Inject initial thinking prompt
-            messages.append({
-                "role": "user",
-                "content": "Before using tools, think through your strategy: Review what you already know from our conversation. What information have you already gathered? What's still missing? Use what you know to be efficient - don't re-search things you've already found. Output your plan in [THINKING]...[/THINKING] tags."
-            })
+            messages.append(PLANNING_PROMPT)
 
             max_iterations = 20
             iteration = 0
-            full_conversation_response = ""
+            reply_parts: list[str] = []  # what the user saw this turn, joined once at the end
 
             while iteration < max_iterations:
                 iteration += 1
-                print(f"DEBUG: Iteration {iteration}")
+                if config.DEBUG:
+                    print(f"DEBUG: Iteration {iteration}")
 
                 # Inject reflection prompt every 3 iterations
                 if iteration > 1 and iteration % 3 == 0:
-                    messages.append({
-                        "role": "user",
-                        "content": "Progress check: Are you making progress? If yes, continue carefully. If no, try ONE different approach (different keywords, broader search, different account). Don't launch many tools at once - be strategic and measured."
-                    })
-                    print(f"DEBUG: Injected reflection prompt at iteration {iteration}")
+                    messages.append(REFLECTION_PROMPT)
+                    if config.DEBUG:
+                        print(f"DEBUG: Injected reflection prompt at iteration {iteration}")
 
                 # Send thinking indicator if not first iteration
                 if iteration > 1:
                     await websocket.send_text(create_message("thinking", iteration=iteration))
 
                 # Stream directly from Ollama - filter out thinking and tool calls before sending to frontend
-                response_buffer = ""
-                in_thinking = False
-                in_tool = False
-
-                async for chunk in ollama.chat(messages, stream=True):
-                    # Accumulate for tool detection
-                    response_buffer += chunk
-
-                    # Filter out thinking and tool content from streaming display
-                    filtered_chunk = ""
-                    for char in chunk:
-                        # Detect start of thinking block
-                        if char == '[' and response_buffer.endswith('[THINKING'):
-                            in_thinking = True
-
-                        # Detect start of tool block
-                        if char == '[' and response_buffer[-6:].startswith('[TOOL:'):
-                            in_tool = True
-
-                        # Only add char if not in thinking or tool block
-                        if not in_thinking and not in_tool:
-                            filtered_chunk += char
+                response_chunks = []
+                display_filter = StreamDisplayFilter()
+                tool_stream = ToolCallStreamParser()
+
+                # Tokens are coalesced into ~15ms batches to cut websocket frames
+                stream = ollama.chat_coalesced(messages)
+                try:
+                    async for chunk in stream:
+                        # Stop generating once the model has finished its tool calls - it
+                        # has to wait for the results anyway. Whatever it wrote after
+                        # them is a guess at the results, so it's neither shown nor kept
+                        tools_done = tool_stream.feed(chunk)
+                        if tools_done:
+                            chunk = chunk[:tool_stream.cut]
+
+                        # Accumulate for tool detection
+                        response_chunks.append(chunk)
+
+                        # Only send non-thinking, non-tool content to frontend
+                        filtered_chunk = display_filter.feed(chunk)
+                        if filtered_chunk:
+                            await websocket.send_text(create_message("assistant_chunk", content=filtered_chunk))
+
+                        if tools_done:
+                            break
+                finally:
+                    await stream.aclose()
 
-                        # Detect end of thinking block
-                        if char == ']' and response_buffer.endswith('[/THINKING]'):
-                            in_thinking = False
+                # Anything the filter still holds after the tool calls is part of that guess
+                filtered_chunk = "" if tool_stream.done else display_filter.flush()
+                if filtered_chunk:
+                    await websocket.send_text(create_message("assistant_chunk", content=filtered_chunk))
 
-                        # Detect end of tool block
-                        if char == ']' and response_buffer.endswith('[/TOOL]'):
-                            in_tool = False
+                response_buffer = "".join(response_chunks)
 
-                    # Only send non-thinking, non-tool content to frontend
-                    if filtered_chunk:
-                        await websocket.send_text(create_message("assistant_chunk", content=filtered_chunk))
+                # Find which special tags are present in one pass, then only
+                # run the parsers that have something to do
+                tags = scan_response(response_buffer)
 
                 # Process memory updates on complete response
-                response = process_memory_update(response_buffer)
-                print(f"DEBUG: AI response: {response[:200]}...")
+                if "MEMORY_UPDATE" in tags:
+                    # May rewrite the memory file
+                    response = await asyncio.to_thread(process_memory_update, response_buffer)
+                else:
+                    response = response_buffer
+                if config.DEBUG:
+                    print(f"DEBUG: AI response: {response[:200]}...")
 
-                # Parse and log thinking (internal reasoning, not shown to user)
-                thinking = parse_thinking(response)
+                # Parse and log thinking (internal reasoning, not shown to user),
+                # stripping it from the response before processing tools
+                thinking, response = take_thinking(response) if "THINKING" in tags else (None, response.strip())
                 if thinking:
                     print(f"THINKING: {thinking}")
-                    sys.stdout.flush()
-                    # Strip thinking from response before processing tools
-                    response = strip_thinking(response)
 
-                tool_call = parse_tool_call(response)
-                print(f"DEBUG: Tool call parsed: {tool_call}")
+                # Parse every tool call in the response, along with the text ahead of them
+                text_before, tool_calls = split_tool_calls(response) if "TOOL" in tags else (response, [])
+                if config.DEBUG:
+                    print(f"DEBUG: Tool calls parsed: {tool_calls}")
 
-                if tool_call:
-                    tool_name, params = tool_call
-                    print(f"DEBUG: Executing {tool_name} with params: {params}")
-
-                    text_before = extract_text_before_tool(response)
+                if tool_calls:
                     if text_before:
                         # Text already streamed to frontend - just track it
-                        full_conversation_response += text_before
-
-                    # Send tool start
-                    start_time = time.time()
-                    await websocket.send_text(create_message(
-                        "tool_start",
-                        tool_name=tool_name,
-                        params=params,
-                        iteration=iteration
-                    ))
-
-                    # Execute tool
-                    try:
-                        tool_result = await execute_tool(tool_name, params, depth=0, websocket=websocket)
-                        print(f"DEBUG: Tool result: {tool_result}")
-                    except Exception as e:
-                        tool_result = f"Error: {str(e)}"
-                        print(f"DEBUG: Tool error: {e}")
-
-                    # Send tool result (NEW - visible to user)
-                    duration_ms = int((time.time() - start_time) * 1000)
-                    await websocket.send_text(create_message(
-                        "tool_result",
-                        tool_name=tool_name,
-                        result=tool_result,
-                        iteration=iteration,
-                        duration_ms=duration_ms
-                    ))
+                        reply_parts.append(text_before)
+
+                    # Send tool starts. The calls run concurrently, so each is
+                    # numbered for the client to match its result to its card
+                    for call_index, (tool_name, params) in enumerate(tool_calls):
+                        if config.DEBUG:
+                            print(f"DEBUG: Executing {tool_name} with params: {params}")
+                        await websocket.send_text(create_message(
+                            "tool_start",
+                            tool_name=tool_name,
+                            params=params,
+                            iteration=iteration,
+                            call_index=call_index
+                        ))
+
+                    # Execute independent tools concurrently
+                    timed_results = await execute_tools_parallel(tool_calls, depth=0, websocket=websocket)
+                    tool_results = [tool_result for tool_result, _ in timed_results]
+
+                    # Send tool results (NEW - visible to user)
+                    for call_index, ((tool_name, _), (tool_result, duration_ms)) in enumerate(zip(tool_calls, timed_results)):
+                        if config.DEBUG:
+                            print(f"DEBUG: Tool result: {tool_result}")
+                        await websocket.send_text(create_message(
+                            "tool_result",
+                            tool_name=tool_name,
+                            result=tool_result,
+                            iteration=iteration,
+                            call_index=call_index,
+                            duration_ms=duration_ms
+                        ))
 
                     # Update conversation
                     messages.append({"role": "assistant", "content": response})
                     messages.append({
                         "role": "user",
-                        "content": f"[Tool Result from {tool_name}]: {tool_result}"
+                        "content": "\n\n".join(
+                            f"[Tool Result from {tool_name}]: {tool_result}"
+                            for (tool_name, _), tool_result in zip(tool_calls, tool_results)
+                        )
                     })
                 else:
                     # Final response already streamed to frontend - just track it
                     cleaned = strip_tool_call(response)
                     if cleaned:
                         print(f"ASSISTANT: {cleaned}")
-                        sys.stdout.flush()
                         # Text already streamed to frontend - just track it
-                        full_conversation_response += cleaned
+                        reply_parts.append(cleaned)
                         break
                     else:
                         # Model generated only thinking, no response - continue to next iteration
-                        print(f"DEBUG: Model generated only thinking, continuing...")
+                        if config.DEBUG:
+                            print("DEBUG: Model generated only thinking, continuing...")
                         if iteration >= max_iterations - 1:
                             # Hit max iterations without response, send error
                             error_msg = "I apologize, I'm having trouble formulating a response. Could you rephrase your request?"
-                            for char in error_msg:
-                                await websocket.send_text(create_message("assistant_chunk", content=char))
-                            full_conversation_response += error_msg
+                            await websocket.send_text(create_message("assistant_chunk", content=error_msg))
+                            reply_parts.append(error_msg)
                             break
                         continue
 
             # Send end message
             await websocket.send_text(create_message("end", total_iterations=iteration))
 
-            if full_conversation_response.strip():
-                conversations[session_id].append({
+            full_conversation_response = "".join(reply_parts).strip()
+            if full_conversation_response:
+                history.append({
                     "role": "assistant",
-                    "content": full_conversation_response.strip()
+                    "content": full_conversation_response
                 })
 
+            # Summarize only now, so it doesn't compete with the reply for the model
+            if unsummarized and summary_task is None:
+                summarizing = len(unsummarized)
+                summary_task = asyncio.create_task(summarize_history(summary, unsummarized[:summarizing]))
+
     except WebSocketDisconnect:
-        if session_id in conversations:
-            del conversations[session_id]
+        pass
     except Exception as e:
         print(f"ERROR: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        conversations.pop(session_id, None)
+        if summary_task is not None:
+            summary_task.cancel()
 
 @app.get("/health")
 async def health():